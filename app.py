@@ -2,11 +2,32 @@
 Streamlit UI for Task-Oriented Planning Assistant
 Creative & Interactive Version
 """
+import hashlib
+import hmac
+import os
+import uuid
+
 import streamlit as st
-from main import GeminiTeacher, PlanningSystem, EnhancedTeacher
-from web_research import PlannerAgent
-import time
-import random
+import ui_assets
+from metrics import metrics
+from plan_model import load_plan
+from resources import get_shared_resources
+
+# Progress bar position and message shown when each planning stage is reached
+PROGRESS_MESSAGES = {
+    'prompt_built': (10, "🧠 Thinking deeply..."),
+    'model_call_started': (25, "✍️ Crafting your plan..."),
+    'first_token': (50, "🎯 Structuring pathway..."),
+    'research_done': (90, "🔍 Adding the resources I found..."),
+    'merged': (100, "⚡ Adding final touches..."),
+}
+
+# Seconds between checks on plans being generated in the background
+JOB_POLL_SECONDS = 0.5
+
+# Cookie that keeps an anonymous browser's signed user id across reloads
+USER_COOKIE = 'planwell_user'
+USER_COOKIE_DAYS = 365
 
 # Page configuration
 st.set_page_config(
@@ -17,198 +38,114 @@ st.set_page_config(
 )
 
 # Custom CSS for creative styling
-st.markdown("""
-    <style>
-    /* Global Styles */
-    :root {
-        --primary-color: #6366F1;
-        --secondary-color: #EC4899;
-        --accent-color: #F59E0B;
-        --success-color: #10B981;
-        --danger-color: #EF4444;
-    }
-    
-    /* Main Header with Gradient */
-    .main-header {
-        # background: linear-gradient(135deg, #6366F1 0%, #EC4899 50%, #F59E0B 100%);
-        # padding: 1px;
-        # border-radius: 20px;
-        text-align: center;
-        color: white;
-        margin-bottom: 20px;
-        # box-shadow: 0 5px 15px rgba(99, 102, 241, 0.3);
-    }
-    
-    .main-header h1 {
-        font-size: 1.8em;
-        margin: 0;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
-    }
-    
-    .main-header h3 {
-        margin: -20px 0 0 0;
-        opacity: 0.95;
-        font-size: 1em;
-    }
-    
-    .main-header p {
-        margin: -10px 0 0 0;
-        font-size: 0.9em;
-        opacity: 0.9;
-    }
-    
-    /* Goal Section */
-    .goal-section {
-        background: linear-gradient(135deg, #E0E7FF 0%, #FCE7F3 100%);
-        padding: 10px;
-        border-radius: 15px;
-        margin-bottom: 10px;
-        border: 2px solid #6366F1;
-        border-left: 6px solid #EC4899;
-        box-shadow: 0 4px 15px rgba(99, 102, 241, 0.15);
-        transition: all 0.3s ease;
-    }
-    
-    .goal-section:hover {
-        box-shadow: 0 8px 25px rgba(99, 102, 241, 0.25);
-        transform: translateY(-2px);
-    }
-    
-    .goal-section h3 {
-        color: #4F46E5;
-        margin-top: 0;
-        font-size: 1.3em;
-    }
-    
-    .goal-section p {
-        color: #6B7280;
-        line-height: 1.6;
-    }
-    
-    /* Plan Section */
-    .plan-section {
-        background: linear-gradient(135deg, #F0F9FF 0%, #F5F3FF 50%, #FEF3C7 100%);
-        padding: 25px;
-        border-radius: 15px;
-        margin: 20px 0;
-        border: 2px dashed #6366F1;
-        box-shadow: 0 4px 15px rgba(99, 102, 241, 0.1);
-    }
-    
-    .plan-section h3 {
-        color: #10B981;
-        margin-top: 0;
-        font-size: 1.3em;
-    }
-    
-    /* Success Box */
-    .success-box {
-        background: linear-gradient(135deg, #D1FAE5 0%, #A7F3D0 100%);
-        padding: 20px;
-        border-radius: 12px;
-        border-left: 5px solid #10B981;
-        color: #065F46;
-        margin: 15px 0;
-        box-shadow: 0 4px 12px rgba(16, 185, 129, 0.15);
-    }
-    
-    .success-box h3 {
-        color: #047857;
-        margin-top: 0;
-    }
-    
-    .success-box p {
-        color: #065F46;
-    }
-    
-    /* Info Box */
-    .info-box {
-        background: linear-gradient(135deg, #FEF3C7 0%, #FCD34D 100%);
-        padding: 20px;
-        border-radius: 15px;
-        border-left: 5px solid #F59E0B;
-        color: #92400E;
-        margin: 15px 0;
-        box-shadow: 0 4px 12px rgba(245, 158, 11, 0.15);
-    }
-    
-    .info-box h4 {
-        color: #D97706;
-        margin-top: 0;
-    }
-    
-    /* Feature Cards */
-    .feature-card {
-        background: linear-gradient(135deg, #F3E8FF 0%, #FEE2E2 100%);
-        padding: 20px;
-        border-radius: 12px;
-        border: 2px solid #EC4899;
-        margin: 10px 0;
-        transition: all 0.3s ease;
-    }
-    
-    .feature-card h4 {
-        color: #9F1239;
-        margin-top: 0;
-    }
-    
-    .feature-card p {
-        color: #6B7280;
-    }
-    
-    .feature-card:hover {
-        transform: translateX(5px);
-        box-shadow: 0 4px 15px rgba(236, 72, 153, 0.2);
-    }
-    
-    /* Buttons */
-    .stButton > button {
-        background: linear-gradient(135deg, #6366F1 0%, #EC4899 100%);
-        color: white !important;
-        border: none;
-        border-radius: 10px;
-        padding: 12px 24px;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 15px rgba(99, 102, 241, 0.3);
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(99, 102, 241, 0.4);
-    }
-    
-    /* Text Area */
-    .stTextArea textarea {
-        border: 2px solid #6366F1 !important;
-        border-radius: 10px !important;
-    }
-    
-    /* Progress Bar */
-    .stProgress > div > div > div {
-        background: linear-gradient(90deg, #6366F1 0%, #EC4899 100%);
-    }
+st.markdown(ui_assets.CSS, unsafe_allow_html=True)
+
+@st.cache_resource
+def shared_resources():
+    """Model clients, caches and HTTP pools shared by every browser session"""
+    return get_shared_resources()
+
+
+def sign_user_id(user_id, secret):
+    """`user_id.signature`, so a cookie edited to another id is rejected"""
+    signature = hmac.new(secret.encode(), user_id.encode(), hashlib.sha256).hexdigest()
+    return f"{user_id}.{signature}"
+
+
+def verified_user_id(token, secret):
+    """The user id in a token made by sign_user_id, or None if it was not"""
+    user_id, _, _ = (token or '').partition('.')
+    if user_id and hmac.compare_digest(token, sign_user_id(user_id, secret)):
+        return user_id
+    return None
+
+
+def session_user_id():
+    """Id for this browser's history, issued by the server and never read from the URL
+
+    A user signed in with st.login() is keyed by their account. Anyone else
+    gets a random id for the session; with USER_ID_SECRET set it is also
+    kept in a cookie signed with that secret, so a reload finds the same
+    history and an edited or forged cookie only starts a new one.
+    """
+    if st.user.get('is_logged_in'):
+        return st.user.get('sub') or st.user.get('email')
+    user_id = st.session_state.get('user_id')
+    if user_id:
+        return user_id
     
-    </style>
-""", unsafe_allow_html=True)
+    secret = os.getenv('USER_ID_SECRET')
+    if secret:
+        user_id = verified_user_id(st.context.cookies.get(USER_COOKIE), secret)
+    if not user_id:
+        user_id = uuid.uuid4().hex
+        if secret:
+            st.html(f"""<script>
+                document.cookie = "{USER_COOKIE}={sign_user_id(user_id, secret)}; path=/; "
+                    + "max-age={USER_COOKIE_DAYS * 86400}; SameSite=Strict"
+                    + (location.protocol === "https:" ? "; Secure" : "");
+            </script>""", unsafe_allow_javascript=True)
+    st.session_state.user_id = user_id
+    return user_id
+
+
+def is_admin():
+    """Whether this session may see and reset the pipeline metrics
+
+    Only with METRICS_ADMIN_TOKEN set, once the app was opened with
+    ?admin=<that token>. The token is then dropped from the URL so it
+    doesn't linger in the address bar or get shared with a link.
+    """
+    token = os.getenv('METRICS_ADMIN_TOKEN')
+    if not token:
+        return False
+    given = st.query_params.get('admin')
+    if given is not None:
+        del st.query_params['admin']
+        st.session_state.admin = hmac.compare_digest(given, token)
+    return st.session_state.get('admin', False)
+
+
+def render_plan_job(job):
+    """One background plan: its progress and partial text while running, then the result"""
+    with st.container(border=True):
+        st.markdown(f"**🎯 {job.goal}**")
+        if not job.done:
+            percent, message = PROGRESS_MESSAGES.get(job.stage, (5, "⏳ Getting ready..."))
+            st.progress(percent)
+            st.info(message)
+            if job.text:
+                st.markdown(job.text + "▌")
+            return
+        
+        if job.error:
+            st.error(f"❌ Error: {job.error}")
+        else:
+            st.markdown("""
+                <div class='success-box'>
+                    <h3>🎉 Plan Created Successfully!</h3>
+                    <p>Your personalized roadmap is ready. Follow these steps to achieve your goal!</p>
+                </div>
+            """, unsafe_allow_html=True)
+            st.markdown('<div class="plan-section">', unsafe_allow_html=True)
+            st.markdown(job.text)
+            st.markdown('</div>', unsafe_allow_html=True)
+        if st.button("✖️ Dismiss", key=f"dismiss_{job.id}"):
+            st.session_state.plan_jobs.remove(job.id)
+            st.rerun()
 
-# Initialize session state
-if 'professor' not in st.session_state:
-    try:
-        st.session_state.professor = PlannerAgent()
-        st.session_state.initialized = True
-    except ValueError as e:
-        st.session_state.initialized = False
-        st.session_state.error_msg = str(e)
+
+# Fetch this user's planner on every run rather than keeping it in session
+# state: the shared manager evicts idle users and rebuilds them on return
+try:
+    professor = shared_resources().user_states.agent(session_user_id())
+    st.session_state.initialized = True
+except ValueError as e:
+    st.session_state.initialized = False
+    st.session_state.error_msg = str(e)
 
 # Creative Header
-st.markdown("""
-    <div class='main-header'>
-        <h1>🎓 Professor Planwell</h1>
-        <h3>✨ Your AI-Powered Planning Assistant ✨</h3>
-        <p>Transform your wildest dreams into actionable step-by-step plans</p>
-    </div>
-""", unsafe_allow_html=True)
+st.markdown(ui_assets.HEADER, unsafe_allow_html=True)
 
 # Error handling
 if not st.session_state.initialized:
@@ -219,7 +156,6 @@ else:
     with st.sidebar:
         st.markdown("### 📊 Your Planning Dashboard")
         
-        professor = st.session_state.professor
         conversation_count = len(professor.teacher.conversation_history)
         
         # Metrics
@@ -261,6 +197,36 @@ else:
         ]
         for i, tip in enumerate(tips, 1):
             st.caption(f"{i}. {tip}")
+        
+        # Admin panel, shown with ?admin=<METRICS_ADMIN_TOKEN> in the URL
+        if is_admin():
+            st.divider()
+            st.markdown("### 🛠️ Pipeline Metrics")
+            snapshot = metrics.snapshot()
+            st.dataframe([
+                {
+                    'stage': stage,
+                    'count': stats['count'],
+                    'p50 ms': round(stats['p50'] * 1000, 1),
+                    'p95 ms': round(stats['p95'] * 1000, 1),
+                    'p99 ms': round(stats['p99'] * 1000, 1)
+                }
+                for stage, stats in sorted(snapshot['stages'].items())
+            ], hide_index=True)
+            for counter in snapshot['counters']:
+                labels = ', '.join(f"{k}={v}" for k, v in counter['labels'].items())
+                st.caption(f"{counter['name']}{f' ({labels})' if labels else ''}: {counter['value']}")
+            for source, values in snapshot['collected'].items():
+                st.caption(f"{source}: " + ', '.join(
+                    f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in values.items()
+                ))
+            st.download_button(
+                "⬇️ Prometheus metrics", metrics.prometheus(),
+                file_name="metrics.prom", mime="text/plain"
+            )
+            if st.button("🧹 Reset metrics"):
+                metrics.reset()
+                st.rerun()
     
     # Main content with tabs
     tab1, tab2, tab3, tab4 = st.tabs(["🚀 Create Plan", "📈 Progress", "📚 Guide", "🎨 About"])
@@ -304,54 +270,38 @@ else:
         if clear_button:
             st.rerun()
         
-        # Process goal
-        if submit_button and goal_input.strip():
-            loading_messages = [
-                "🧠 Thinking deeply...",
-                "✍️ Crafting your plan...",
-                "🔍 Researching resources...",
-                "🎯 Structuring pathway...",
-                "⚡ Adding final touches..."
+        # Plan in the background, so the page stays usable while Gemini works
+        plan_jobs = professor.resources.plan_jobs
+        if 'plan_jobs' not in st.session_state:
+            # Pick up plans still being made before the page was reloaded
+            st.session_state.plan_jobs = [
+                job.id for job in plan_jobs.for_user(professor.teacher.user_id) if not job.done
             ]
-            placeholder = st.empty()
-            
-            try:
-                progress_bar = st.progress(0)
-                
-                for i in range(100):
-                    time.sleep(0.05)
-                    progress_bar.progress(i + 1)
-                    if i % 20 == 0:
-                        placeholder.info(random.choice(loading_messages))
-                
-                placeholder.empty()
-                
-                # Create plan
-                plan = st.session_state.professor.process_goal(goal_input)
-                
-                # Success message
-                st.markdown("""
-                    <div class='success-box'>
-                        <h3>🎉 Plan Created Successfully!</h3>
-                        <p>Your personalized roadmap is ready. Follow these steps to achieve your goal!</p>
-                    </div>
-                """, unsafe_allow_html=True)
-                
-                # Display plan
-                st.markdown('<div class="plan-section">', unsafe_allow_html=True)
-                st.markdown(plan)
-                st.markdown('</div>', unsafe_allow_html=True)
-                
-            except Exception as e:
-                st.error(f"❌ Error: {str(e)}")
         
+        if submit_button and goal_input.strip():
+            job = plan_jobs.submit(professor, goal_input)
+            st.session_state.plan_jobs.append(job.id)
         elif submit_button and not goal_input.strip():
             st.warning("⚠️ Please enter a goal to create a plan.")
+        
+        jobs = [plan_jobs.get(job_id) for job_id in st.session_state.plan_jobs]
+        polling = any(job is not None and not job.done for job in jobs)
+        
+        @st.fragment(run_every=JOB_POLL_SECONDS if polling else None)
+        def plan_job_results():
+            jobs = [plan_jobs.get(job_id) for job_id in reversed(st.session_state.plan_jobs)]
+            jobs = [job for job in jobs if job is not None]
+            for job in jobs:
+                render_plan_job(job)
+            if polling and all(job.done for job in jobs):
+                # Refresh the whole page so the dashboard and Progress tab see the new plans
+                st.rerun()
+        
+        plan_job_results()
     
     with tab2:
         st.header("📈 Your Progress Hub")
         
-        professor = st.session_state.professor
         history = professor.teacher.conversation_history
         
         if history:
@@ -368,8 +318,30 @@ else:
             for i, entry in enumerate(reversed(history[-10:]), 1):
                 with st.expander(f"🎯 Goal {len(history) - i + 1}: {entry['user'][:60]}..."):
                     st.markdown(f"> **{entry['user']}**")
-                    summary = entry['assistant'][:300] + "..." if len(entry['assistant']) > 300 else entry['assistant']
-                    st.markdown(summary)
+                    plan = load_plan(entry['user'], entry['assistant'])
+                    if plan.steps:
+                        st.markdown(''.join(
+                            f"{n}. **{step.title}**" + (f" — ⏱️ {step.time}" if step.time else "") + "\n"
+                            for n, step in enumerate(plan.steps, 1)
+                        ))
+                    else:
+                        text = plan.markdown
+                        st.markdown(text[:300] + "..." if len(text) > 300 else text)
+                    
+                    # Refine: patch this plan instead of planning from scratch
+                    change = st.text_input(
+                        "✏️ Refine this plan",
+                        placeholder="e.g., Same plan, but over 6 months instead of 3",
+                        key=f"refine_input_{entry['id']}"
+                    )
+                    if st.button("🔁 Refine", key=f"refine_{entry['id']}") and change.strip():
+                        with st.spinner("✍️ Revising your plan..."):
+                            revised = professor.revise_plan(plan, change)
+                        if revised.error:
+                            st.error(f"❌ Error: {revised.error}")
+                        else:
+                            st.success("🎉 Plan refined! It's now your latest goal.")
+                            st.markdown(revised.markdown)
         else:
             st.markdown("""
                 <div style='background: linear-gradient(135deg, #E0E7FF 0%, #FCE7F3 100%); padding: 40px; border-radius: 15px; text-align: center;'>
@@ -0,0 +1,118 @@
+"""
+Batch planning: read goals from a JSONL/CSV/text file and write plans as JSONL
+
+    python batch.py goals.jsonl plans.jsonl --workers 8
+
+Run the same command again after an interruption and it picks up where it
+left off: goals whose id already has a plan in the output file are skipped.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+
+def read_goals(path):
+    """Yield (id, goal) pairs from a .jsonl, .csv or plain text file
+
+    JSONL lines may be plain strings or objects with a "goal" and an
+    optional "id"; CSV files need a "goal" column and may have an "id"
+    column. Goals without an id are numbered by their position.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8') as f:
+        if extension == '.csv':
+            for number, row in enumerate(csv.DictReader(f), 1):
+                if row.get('goal', '').strip():
+                    yield str(row.get('id') or number), row['goal'].strip()
+            return
+
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if extension == '.jsonl':
+                record = json.loads(line)
+                if isinstance(record, str):
+                    yield str(number), record
+                else:
+                    yield str(record.get('id', number)), record['goal']
+            else:
+                yield str(number), line
+
+
+def finished_ids(path):
+    """Ids that already have a successful plan in an earlier output file"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A half-written last line from an interrupted run
+                continue
+            if 'plan' in record:
+                done.add(record['id'])
+    return done
+
+
+def run_batch(professor, input_path, output_path, workers=4, use_cache=True):
+    """Plan every goal in input_path that output_path doesn't have yet
+
+    Each output line holds the plan in its structured form (Plan.to_dict()).
+    """
+    done = finished_ids(output_path)
+    todo = [(goal_id, goal) for goal_id, goal in read_goals(input_path) if goal_id not in done]
+    print(f"📋 {len(todo)} goals to plan ({len(done)} already done)")
+
+    started = time.monotonic()
+    written = failed = 0
+    with open(output_path, 'a', encoding='utf-8') as out:
+        results = professor.process_goals(
+            (goal for _, goal in todo), max_workers=workers, use_cache=use_cache
+        )
+        for index, goal, plan in results:
+            record = {'id': todo[index][0], 'goal': goal}
+            if plan.error:
+                record['error'] = plan.error
+                failed += 1
+            else:
+                record['plan'] = plan.to_dict()
+                written += 1
+            # One line per finished goal, flushed so an interruption loses nothing
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+
+    elapsed = time.monotonic() - started
+    print(f"✅ {written} plans written, {failed} failed, in {elapsed:.1f}s")
+    return written, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create plans for many goals at once")
+    parser.add_argument('input', help="goals file (.jsonl, .csv or one goal per line)")
+    parser.add_argument('output', help="JSONL file to append plans to")
+    parser.add_argument('--workers', type=int, default=4, help="goals planned at the same time")
+    parser.add_argument('--no-cache', action='store_true', help="always generate fresh plans")
+    args = parser.parse_args(argv)
+
+    from web_research import PlannerAgent
+
+    try:
+        professor = PlannerAgent()
+    except ValueError as e:
+        print(f"⚠️ {e}")
+        return 1
+
+    _, failed = run_batch(
+        professor, args.input, args.output, workers=args.workers, use_cache=not args.no_cache
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
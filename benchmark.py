@@ -0,0 +1,480 @@
+"""
+Offline benchmarks for the planning pipeline
+
+    python benchmark.py                       # every scenario, default sizes
+    python benchmark.py single cache --goals 50 --latency 0.8 --failure-rate 0.05
+    python benchmark.py --quick --json results.json
+    python benchmark.py --startup             # import-time budget check only
+
+Runs PlannerAgent against a deterministic stand-in for Gemini (configurable
+latency, token rate and failure rate) and a local fake search server, so
+no API key or network is needed. Caches, memory and indexes live in a
+temporary directory. Each scenario reports throughput and p50/p95/p99
+latency; --json also saves the per-stage timings from metrics.py, which
+makes runs easy to compare for regressions.
+
+--startup instead imports the entry points in a fresh interpreter and
+fails if that takes longer than --budget-ms or loads any of the heavy
+dependencies that should only load on first use.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scheduler import estimate_tokens
+
+SCENARIOS = ['single', 'stream', 'concurrent', 'batch', 'cache']
+
+# Entry points that must import quickly, and what they must not import
+STARTUP_MODULES = ['main', 'web_research', 'batch', 'demo']
+LAZY_MODULES = ['google.generativeai', 'requests', 'bs4', 'numpy']
+
+TOPICS = ['Python', 'Spanish', 'guitar', 'calculus', 'React', 'public speaking', 'chess',
+          'machine learning', 'photography', 'Rust', 'piano', 'SQL', 'drawing', 'French',
+          'statistics', 'Docker', 'cooking', 'marathon running', 'Go', 'writing']
+
+
+def benchmark_goals(count, offset=0):
+    """Distinct, deterministic goals; about half of them trigger web research"""
+    goals = []
+    for i in range(offset, offset + count):
+        topic = TOPICS[i % len(TOPICS)]
+        weeks = 2 + i // len(TOPICS)
+        verb = 'Learn' if i % 2 else 'Get better at'
+        goals.append(f"{verb} {topic} in {weeks} weeks")
+    return goals
+
+
+class FakeQuotaError(Exception):
+    """Stands in for Gemini's 429 so the scheduler retries it"""
+
+    code = 429
+
+
+class _Usage:
+    __slots__ = ('prompt_token_count', 'candidates_token_count', 'total_token_count')
+
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class _Response:
+    __slots__ = ('text', 'usage_metadata')
+
+    def __init__(self, text, usage):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class FakeGeminiModel:
+    """Deterministic stand-in for genai.GenerativeModel
+
+    Answers with a plan (or revision patch) derived from the prompt after
+    `latency` seconds plus the time it takes to "generate" the output at
+    `tokens_per_second`, and fails with a retryable 429 `failure_rate` of
+    the time. Streaming yields the output in chunks at the same rate.
+    """
+
+    def __init__(self, latency=0.5, tokens_per_second=200.0, failure_rate=0.0, seed=0,
+                 chunk_tokens=20):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.chunk_tokens = chunk_tokens
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        # Installed in place of the GenerativeModel class; every "model" is this one
+        return self
+
+    def generate_content(self, prompt, stream=False, generation_config=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.failure_rate
+        time.sleep(self.latency)
+        if failed:
+            raise FakeQuotaError("429 Resource has been exhausted (benchmark)")
+
+        schema = (generation_config or {}).get('response_schema') or {}
+        text = self.revision(prompt) if 'changes' in schema.get('properties', {}) else self.plan(prompt)
+        prompt_tokens = estimate_tokens(prompt)
+        if not stream:
+            time.sleep(estimate_tokens(text) / self.tokens_per_second)
+            return _Response(text, _Usage(prompt_tokens, estimate_tokens(text)))
+        return self._stream(text, prompt_tokens)
+
+    def _stream(self, text, prompt_tokens):
+        size = self.chunk_tokens * 4
+        for start in range(0, len(text), size):
+            chunk = text[start:start + size]
+            time.sleep(estimate_tokens(chunk) / self.tokens_per_second)
+            yield _Response(chunk, _Usage(prompt_tokens, estimate_tokens(text[:start + size])))
+
+    @staticmethod
+    def plan(prompt):
+        goal = prompt.rsplit("Goal:", 1)[-1].strip() or "your goal"
+        rng = random.Random(zlib.crc32(goal.encode('utf-8')))
+        steps = [{
+            'title': f"Stage {n}: build {goal.lower()} skills, part {n}",
+            'reasoning': "Each stage builds on the last, like laying bricks for a house. " * 2,
+            'time': f"{rng.randint(1, 4)} weeks",
+            'resources': [f"Guide {n}", f"Practice set {n}"],
+            'success_criteria': f"You can explain and apply part {n} without notes."
+        } for n in range(1, rng.randint(4, 6) + 1)]
+        return json.dumps({
+            'analysis': {
+                'summary': f"You want to {goal[0].lower() + goal[1:]}.",
+                'importance': "Clear goals keep practice focused and motivating.",
+                'challenges': ["Finding time every week", "Staying motivated on plateaus"]
+            },
+            'steps': steps,
+            'research': "Look for a structured course to complement the plan.",
+            'notes': {
+                'encouragement': "Every expert was once a beginner!",
+                'tips': ["Practice a little every day", "Track what you learn"],
+                'focus': "Consistency over intensity."
+            }
+        })
+
+    @staticmethod
+    def revision(prompt):
+        return json.dumps({'changes': [{'action': 'replace', 'step': 1, 'time': '3 weeks'}]})
+
+
+def install_fake_model(model):
+    """Route every GeminiTeacher model through `model`"""
+    import google.generativeai as genai
+    import main
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    os.environ['GEMINI_CONTEXT_CACHE'] = '0'
+    genai.GenerativeModel = model
+    with main._shared_models_lock:
+        main._shared_models.clear()
+
+
+class FakeSearchServer:
+    """Local HTTP server answering any query with a Google-like results page"""
+
+    def __init__(self, latency=0.05, results=6):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(server.latency)
+                if self.headers.get('If-None-Match') == '"benchmark"':
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = server.page(self.path).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', '"benchmark"')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.latency = latency
+        self.results = results
+        self.requests = 0
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, name='fake-search', daemon=True).start()
+
+    @property
+    def search_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/search?q={{query}}"
+
+    def page(self, path):
+        # Some filler first, like a real results page
+        blocks = ["<div class='nav'>" + "<span>menu</span>" * 200 + "</div>"]
+        for n in range(self.results):
+            blocks.append(
+                f"<div class='g'><a href='https://example.com{path}&r={n}'>"
+                f"<h3>Result {n + 1} for {path}</h3></a><p>{'snippet ' * 40}</p></div>"
+            )
+        return "<html><body>" + ''.join(blocks) + "</body></html>"
+
+    def close(self):
+        self._server.shutdown()
+
+
+def summarize(name, latencies, wall, errors, extra=None):
+    """Throughput and latency percentiles for one scenario"""
+    ordered = sorted(latencies)
+
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+
+    result = {
+        'scenario': name,
+        'goals': len(latencies),
+        'errors': errors,
+        'seconds': round(wall, 3),
+        'throughput': round(len(latencies) / wall, 2) if wall else 0.0,
+        'p50_ms': round(percentile(0.5), 1),
+        'p95_ms': round(percentile(0.95), 1),
+        'p99_ms': round(percentile(0.99), 1),
+    }
+    result.update(extra or {})
+    return result
+
+
+class Benchmark:
+    """Runs scenarios against fresh shared resources in a temporary directory"""
+
+    def __init__(self, args, model, server):
+        self.args = args
+        self.model = model
+        self.server = server
+        self.workdir = tempfile.mkdtemp(prefix='planner-bench-')
+        self._runs = 0
+
+    def resources(self):
+        """New SharedResources with empty caches, so scenarios don't warm each other"""
+        from resources import SharedResources
+
+        self._runs += 1
+        directory = os.path.join(self.workdir, str(self._runs))
+        os.environ.update({
+            'PLAN_CACHE_PATH': os.path.join(directory, 'plans.sqlite3'),
+            'RESEARCH_CACHE_PATH': os.path.join(directory, 'research.sqlite3'),
+            'KNOWLEDGE_INDEX_PATH': os.path.join(directory, 'knowledge.sqlite3'),
+            'MEMORY_BACKEND': 'memory',
+            'GEMINI_MAX_IN_FLIGHT': str(self.args.max_in_flight),
+            'GEMINI_RPM': str(self.args.rpm),
+            'GEMINI_TPM': str(self.args.tpm),
+        })
+        return SharedResources()
+
+    def agent(self, resources, user_id='bench'):
+        from web_research import PlannerAgent
+
+        agent = PlannerAgent(resources=resources, user_id=user_id)
+        agent.researcher.search_url = self.server.search_url
+        return agent
+
+    def timed_goals(self, agent, goals, use_cache=False):
+        latencies, errors = [], 0
+        for goal in goals:
+            started = time.perf_counter()
+            plan = agent.process_goal(goal, use_cache=use_cache)
+            latencies.append(time.perf_counter() - started)
+            errors += bool(plan.error)
+        return latencies, errors
+
+    def single(self):
+        """One session, one goal at a time, no plan cache"""
+        agent = self.agent(self.resources())
+        started = time.perf_counter()
+        latencies, errors = self.timed_goals(agent, benchmark_goals(self.args.goals))
+        return summarize('single', latencies, time.perf_counter() - started, errors)
+
+    def stream(self):
+        """One session streaming each plan; also reports time to first chunk"""
+        agent = self.agent(self.resources())
+        latencies, first_chunks, errors = [], [], 0
+        started = time.perf_counter()
+        for goal in benchmark_goals(self.args.goals):
+            goal_started = time.perf_counter()
+            first = None
+            chunks = agent.stream_goal(goal, use_cache=False)
+            while True:
+                try:
+                    next(chunks)
+                except StopIteration as done:
+                    errors += bool(done.value.error)
+                    break
+                if first is None:
+                    first = time.perf_counter() - goal_started
+            latencies.append(time.perf_counter() - goal_started)
+            first_chunks.append(first or 0.0)
+        first_chunks.sort()
+        return summarize('stream', latencies, time.perf_counter() - started, errors, {
+            'first_chunk_p50_ms': round(first_chunks[len(first_chunks) // 2] * 1000, 1),
+        })
+
+    def concurrent(self):
+        """Many sessions (one PlannerAgent each) sharing one set of resources"""
+        resources = self.resources()
+        sessions = self.args.sessions
+        per_session = max(1, self.args.goals // sessions)
+        results = [None] * sessions
+
+        def run(number):
+            agent = self.agent(resources, user_id=f"user-{number}")
+            goals = benchmark_goals(per_session, offset=number * per_session)
+            results[number] = self.timed_goals(agent, goals)
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(sessions)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+        latencies = [latency for session, _ in results for latency in session]
+        errors = sum(session_errors for _, session_errors in results)
+        return summarize('concurrent', latencies, wall, errors, {'sessions': sessions})
+
+    def batch(self):
+        """PlannerAgent.process_goals over a worker pool, as batch.py runs it"""
+        from metrics import metrics
+
+        agent = self.agent(self.resources())
+        started = time.perf_counter()
+        errors = sum(bool(plan.error) for _, _, plan in agent.process_goals(
+            benchmark_goals(self.args.goals), max_workers=self.args.workers, use_cache=False
+        ))
+        wall = time.perf_counter() - started
+        # Per-goal latency comes from the process_goal span
+        stage = metrics.snapshot()['stages'].get('process_goal', {})
+        result = summarize('batch', [], wall, errors, {'workers': self.args.workers})
+        result.update({
+            'goals': stage.get('count', 0),
+            'throughput': round(stage.get('count', 0) / wall, 2) if wall else 0.0,
+            'p50_ms': round(stage.get('p50', 0) * 1000, 1),
+            'p95_ms': round(stage.get('p95', 0) * 1000, 1),
+            'p99_ms': round(stage.get('p99', 0) * 1000, 1),
+        })
+        return result
+
+    def cache(self):
+        """The same goals asked again: plan and research caches should answer them"""
+        from metrics import metrics
+
+        agent = self.agent(self.resources())
+        goals = benchmark_goals(self.args.goals)
+        for goal in goals:
+            agent.process_goal(goal, remember=False)
+        metrics.reset()
+        calls = self.model.calls
+
+        started = time.perf_counter()
+        latencies, errors = [], 0
+        for goal in goals:
+            goal_started = time.perf_counter()
+            plan = agent.process_goal(goal, remember=False)
+            latencies.append(time.perf_counter() - goal_started)
+            errors += bool(plan.error)
+        wall = time.perf_counter() - started
+        return summarize('cache', latencies, wall, errors, {'model_calls': self.model.calls - calls})
+
+
+def check_startup(budget_ms, runs=3):
+    """Import STARTUP_MODULES in fresh interpreters; a list of problems, empty if within budget"""
+    import subprocess
+
+    script = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        f"for name in {STARTUP_MODULES!r}:\n"
+        "    __import__(name)\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"print(json.dumps([elapsed, [m for m in {LAZY_MODULES!r} if m in sys.modules]]))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    timings, loaded = [], set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', script], cwd=here, check=True,
+                                capture_output=True, text=True).stdout
+        elapsed, modules = json.loads(output.strip().splitlines()[-1])
+        timings.append(elapsed * 1000)
+        loaded.update(modules)
+
+    # The best of a few runs, so one slow disk read doesn't fail the check
+    best = min(timings)
+    print(f"⏱️ Importing {', '.join(STARTUP_MODULES)} took {best:.0f} ms (budget {budget_ms} ms)")
+    problems = [f"{module} is imported at startup" for module in sorted(loaded)]
+    if best > budget_ms:
+        problems.append(f"startup took {best:.0f} ms, over the {budget_ms} ms budget")
+    return problems
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the planner offline")
+    parser.add_argument('scenarios', nargs='*',
+                        help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--goals', type=int, default=20, help="goals per scenario")
+    parser.add_argument('--sessions', type=int, default=8, help="sessions in the concurrent scenario")
+    parser.add_argument('--workers', type=int, default=8, help="workers in the batch scenario")
+    parser.add_argument('--latency', type=float, default=0.5, help="model latency before output, seconds")
+    parser.add_argument('--token-rate', type=float, default=400.0, help="model output tokens per second")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="share of model calls that fail with 429")
+    parser.add_argument('--search-latency', type=float, default=0.05, help="fake search server latency, seconds")
+    parser.add_argument('--max-in-flight', type=int, default=8, help="GEMINI_MAX_IN_FLIGHT for the run")
+    parser.add_argument('--rpm', type=int, default=100000, help="GEMINI_RPM for the run")
+    parser.add_argument('--tpm', type=int, default=100000000, help="GEMINI_TPM for the run")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the fake model's failures")
+    parser.add_argument('--quick', action='store_true', help="small sizes and fast fakes, for a smoke test")
+    parser.add_argument('--json', help="also write results and per-stage timings to this file")
+    parser.add_argument('--verbose', action='store_true', help="show the agent's own output")
+    parser.add_argument('--startup', action='store_true', help="only check import time and lazy imports")
+    parser.add_argument('--budget-ms', type=int, default=500, help="import time budget for --startup")
+    args = parser.parse_args(argv)
+    unknown = sorted(set(args.scenarios) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenario {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}")
+    if args.quick:
+        args.goals, args.sessions, args.workers = 6, 3, 3
+        args.latency, args.token_rate, args.search_latency = 0.05, 5000.0, 0.01
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.startup:
+        problems = check_startup(args.budget_ms)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if not problems:
+            print("✅ Startup is within budget")
+        return 1 if problems else 0
+
+    from metrics import metrics
+
+    model = FakeGeminiModel(args.latency, args.token_rate, args.failure_rate, args.seed)
+    install_fake_model(model)
+    server = FakeSearchServer(args.search_latency)
+    bench = Benchmark(args, model, server)
+
+    print(f"⏱️ Benchmarking with model latency {args.latency}s, {args.token_rate:g} tokens/s, "
+          f"{args.failure_rate:.0%} failures; search latency {args.search_latency}s")
+    print(f"{'scenario':<12}{'goals':>6}{'errors':>7}{'goals/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+
+    results = []
+    for name in args.scenarios or SCENARIOS:
+        metrics.reset()
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with quiet:
+            result = getattr(bench, name)()
+        result['stages'] = metrics.snapshot()['stages']
+        results.append(result)
+        print(f"{name:<12}{result['goals']:>6}{result['errors']:>7}{result['throughput']:>9.2f}"
+              f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}")
+
+    server.close()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Two-tier response cache: an in-memory LRU in front of a SQLite store
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# A stored value plus its bookkeeping. meta is a free-form dict callers can use
+# for things like HTTP validators; fresh is False once expires_at has passed
+CacheEntry = namedtuple('CacheEntry', 'value meta expires_at fresh')
+
+
+def make_key(*parts):
+    """Build a content-addressed cache key from any number of text parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of JSON-serializable values that survives restarts
+
+    Entries live in memory (up to max_entries) and, when a path is given,
+    in a SQLite file (up to max_disk_entries). Every entry has its own
+    expiry and belongs to a namespace, so a whole generation of entries
+    can be dropped at once when whatever produced them changes. Expired
+    entries are kept for another stale_ttl seconds so lookup() can still
+    offer them for revalidation.
+    """
+
+    def __init__(self, path=None, table='responses', max_entries=256,
+                 max_disk_entries=5000, ttl=7 * 24 * 3600, stale_ttl=0):
+        self.table = table
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    meta TEXT
+                )
+            """)
+            columns = [row[1] for row in self._db.execute(f"PRAGMA table_info({table})")]
+            if 'meta' not in columns:
+                # Caches written before entries had metadata
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN meta TEXT")
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)"
+            )
+            self._db.commit()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        entry = self.lookup(key)
+        if entry is None or not entry.fresh:
+            return None
+        return entry.value
+
+    def lookup(self, key):
+        """Return the CacheEntry for key, stale or not, or None if there is none"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._db is not None:
+                entry = self._load(key, now)
+
+            if entry is not None and entry[2] + self.stale_ttl <= now:
+                self._forget(key)
+                entry = None
+            if entry is None or entry[2] <= now:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if entry is None:
+                return None
+
+            self._remember(key, entry)
+            return CacheEntry(entry[1], entry[3], entry[2], entry[2] > now)
+
+    def set(self, key, value, namespace='', ttl=None, meta=None):
+        """Store a value under key for ttl seconds (default: the cache ttl)"""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        entry = (namespace, value, expires_at, meta or {})
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, namespace, json.dumps(value), expires_at, now, json.dumps(meta or {}))
+                )
+                self._evict_disk(now)
+                self._db.commit()
+
+    def delete(self, key):
+        """Drop a single entry"""
+        with self._lock:
+            self._forget(key)
+
+    def invalidate(self, keep_namespace):
+        """Drop every entry that does not belong to keep_namespace"""
+        with self._lock:
+            for key in [k for k, e in self._memory.items() if e[0] != keep_namespace]:
+                del self._memory[key]
+            if self._db is not None:
+                self._db.execute(
+                    f"DELETE FROM {self.table} WHERE namespace != ?", (keep_namespace,)
+                )
+                self._db.commit()
+
+    def clear(self):
+        """Drop everything, in memory and on disk"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table}")
+                self._db.commit()
+
+    def stats(self):
+        """Hit/miss counters and current sizes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            disk_entries = 0
+            if self._db is not None:
+                disk_entries = self._db.execute(
+                    f"SELECT COUNT(*) FROM {self.table}"
+                ).fetchone()[0]
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': disk_entries,
+            }
+
+    def _remember(self, key, entry):
+        """Put an entry at the front of the in-memory LRU"""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, key, now):
+        """Read an entry from disk, refreshing its LRU position there"""
+        row = self._db.execute(
+            f"SELECT namespace, value, expires_at, meta FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute(
+            f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+        )
+        self._db.commit()
+        return (row[0], json.loads(row[1]), row[2], json.loads(row[3] or '{}'))
+
+    def _forget(self, key):
+        self._memory.pop(key, None)
+        if self._db is not None:
+            self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _evict_disk(self, now):
+        """Drop expired entries, then the least recently used ones over the size limit"""
+        self._db.execute(
+            f"DELETE FROM {self.table} WHERE expires_at <= ?", (now - self.stale_ttl,)
+        )
+        self._db.execute(f"""
+            DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table}
+                ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_disk_entries,))
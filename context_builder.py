@@ -0,0 +1,134 @@
+"""
+Token-budgeted conversation context for planning prompts
+"""
+import re
+import sys
+import threading
+from collections import deque
+
+from scheduler import estimate_tokens
+from plan_model import is_structured
+from summarizer import render_summary
+
+# Lines worth keeping from a plan when it is too long to paste back in full:
+# markdown headings, emoji section titles, bold lines and numbered steps
+HEADING = re.compile(r'^\s*(#{1,6}\s|\*\*|[0-9]+[.)]\s|[^\w\s*#>-]{1,3}\s*[A-Z])')
+
+# The context of a student with no history yet
+EMPTY_CONTEXT = "No previous conversation."
+
+
+def plan_headings(plan, max_lines=10, max_chars=100):
+    """A compact outline of a plan: its headings and step titles"""
+    lines = []
+    for line in plan.splitlines():
+        if HEADING.match(line):
+            line = line.strip()
+            lines.append(line if len(line) <= max_chars else line[:max_chars - 1] + '…')
+            if len(lines) >= max_lines:
+                break
+    return '\n'.join(lines) or plan[:max_chars]
+
+
+class _Turn:
+    """One exchange, rendered both verbatim and compact exactly once"""
+
+    __slots__ = ('entry_id', 'user', 'full', 'compact', 'full_tokens', 'compact_tokens')
+
+    def __init__(self, entry):
+        self.entry_id = entry.get('id')
+        self.user = entry['user']
+        self.full = f"Student: {entry['user']}\nTeacher: {entry['assistant']}\n"
+        self.full_tokens = estimate_tokens(self.full)
+        self.set_compact(entry['user'], entry.get('summary'), entry['assistant'])
+
+    def set_compact(self, user_input, summary, plan=None):
+        """Use the stored summary when there is one, else a cheap outline of the plan
+
+        A structured plan is outlined by its goal alone until the background
+        summary arrives through ContextBuilder.set_summary, so parsing it
+        never delays a response.
+        """
+        if summary:
+            outline = render_summary(summary)
+        elif plan is not None and is_structured(plan):
+            outline = render_summary({'goal': user_input, 'steps': []})
+        else:
+            outline = plan_headings(plan)
+        self.compact = f"Student: {user_input}\nTeacher (plan outline): {outline}\n"
+        self.compact_tokens = estimate_tokens(self.compact)
+
+
+class ContextBuilder:
+    """Keeps the last few exchanges and renders them within a token budget
+
+    The newest `verbatim_turns` exchanges go in verbatim unless a single
+    one would take more than half the budget; everything else goes in as
+    an outline. Exchanges are rendered when added and the assembled
+    context is cached until the next one arrives, so building it is
+    cheap however often it is asked for.
+    """
+
+    def __init__(self, budget_tokens=1200, verbatim_turns=2, max_turns=5):
+        self.budget_tokens = budget_tokens
+        self.verbatim_turns = verbatim_turns
+        self._turns = deque(maxlen=max_turns)
+        self._context = None
+        # Summaries arrive from a background thread
+        self._lock = threading.Lock()
+
+    @property
+    def last_id(self):
+        return self._turns[-1].entry_id if self._turns else None
+
+    def add(self, entry):
+        """Add the newest exchange (a memory entry dict)"""
+        turn = _Turn(entry)
+        with self._lock:
+            self._turns.append(turn)
+            self._context = None
+
+    def load(self, entries):
+        """Replace the exchanges, e.g. from a memory store, oldest first"""
+        turns = [_Turn(entry) for entry in entries]
+        with self._lock:
+            self._turns.clear()
+            self._turns.extend(turns)
+            self._context = None
+
+    def set_summary(self, entry_id, summary):
+        """Swap an exchange's outline for its freshly made summary"""
+        with self._lock:
+            for turn in self._turns:
+                if turn.entry_id == entry_id:
+                    turn.set_compact(turn.user, summary)
+                    self._context = None
+
+    def resident_bytes(self):
+        """Roughly how much memory the rendered exchanges and context take"""
+        with self._lock:
+            size = sys.getsizeof(self._context) if self._context is not None else 0
+            return size + sum(sys.getsizeof(turn.full) + sys.getsizeof(turn.compact) for turn in self._turns)
+
+    def build(self):
+        """The context string for the next prompt"""
+        with self._lock:
+            if self._context is None:
+                self._context = self._render()
+            return self._context
+
+    def _render(self):
+        if not self._turns:
+            return EMPTY_CONTEXT
+
+        remaining = self.budget_tokens
+        parts = []
+        for age, turn in enumerate(reversed(self._turns)):
+            verbatim = age < self.verbatim_turns and turn.full_tokens <= self.budget_tokens // 2
+            text, tokens = (turn.full, turn.full_tokens) if verbatim else (turn.compact, turn.compact_tokens)
+            if tokens > remaining:
+                break
+            parts.append(text)
+            remaining -= tokens
+
+        return "Recent conversation:\n" + ''.join(reversed(parts))
@@ -0,0 +1,106 @@
+"""
+Search result extractors for WebResearch
+
+Both extractors take an iterable of decoded HTML text chunks and return up
+to `limit` results as {'title': ..., 'link': ...} dicts, taken from the
+<div class="g"> blocks of a Google results page.
+"""
+from html.parser import HTMLParser
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class _ResultParser(HTMLParser):
+    """Collects results from div.g blocks and stops as soon as it has enough"""
+
+    def __init__(self, limit):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.results = []
+        self._depth = 0          # div nesting depth inside the current div.g
+        self._link = None
+        self._title = None
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'div':
+            if self._depth:
+                self._depth += 1
+            elif 'g' in (dict(attrs).get('class') or '').split():
+                self._depth = 1
+                self._link = self._title = None
+        elif not self._depth:
+            return
+        elif tag == 'a' and self._link is None:
+            self._link = dict(attrs).get('href')
+        elif tag == 'h3' and self._title is None:
+            self._in_title = True
+            self._title = ''
+
+    def handle_endtag(self, tag):
+        if not self._depth:
+            return
+        if tag == 'h3':
+            self._in_title = False
+        elif tag == 'div':
+            self._depth -= 1
+            if not self._depth and self._link and self._title:
+                self.results.append({'title': self._title, 'link': self._link})
+                if len(self.results) >= self.limit:
+                    raise _StopParsing
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title += data
+
+
+class StreamingResultExtractor:
+    """Parse chunk by chunk with the standard library and stop after `limit` results
+
+    Because it stops early, the rest of the page is never downloaded.
+    """
+
+    def extract(self, chunks, limit=3):
+        parser = _ResultParser(limit)
+        try:
+            for chunk in chunks:
+                parser.feed(chunk)
+            parser.close()
+        except _StopParsing:
+            pass
+        return parser.results
+
+
+class SoupResultExtractor:
+    """BeautifulSoup restricted to div.g blocks, using lxml when it is installed"""
+
+    def __init__(self, parser=None):
+        self.parser = parser
+
+    def extract(self, chunks, limit=3):
+        from bs4 import BeautifulSoup, SoupStrainer
+
+        soup = BeautifulSoup(
+            ''.join(chunks),
+            self.parser or self.default_parser(),
+            parse_only=SoupStrainer('div', class_='g')
+        )
+        results = []
+        for g in soup.find_all('div', class_='g'):
+            anchor = g.find('a')
+            title = g.find('h3')
+            if anchor and title:
+                results.append({'title': title.text, 'link': anchor.get('href')})
+                if len(results) >= limit:
+                    break
+        return results
+
+    @staticmethod
+    def default_parser():
+        try:
+            import lxml  # noqa: F401
+            return 'lxml'
+        except ImportError:
+            return 'html.parser'
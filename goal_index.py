@@ -0,0 +1,222 @@
+"""
+Local similarity index over previously answered goals
+"""
+import os
+import re
+import sqlite3
+import threading
+import zlib
+
+# Words that carry no information about what the student wants to do
+STOPWORDS = {
+    'a', 'an', 'and', 'the', 'i', 'im', 'id', 'd', 'my', 'me', 'to', 'in', 'on',
+    'for', 'of', 'within', 'want', 'would', 'like', 'need',
+    'help', 'can', 'you', 'please', 'how', 'do', 'some', 'get',
+    'with', 'about', 'be', 'is', 'it', 'this', 'that', 'plan', 'planning'
+}
+
+# Verbs that mean the same thing for planning purposes
+SYNONYMS = {'study': 'learn', 'studying': 'learn', 'learning': 'learn', 'master': 'learn',
+            'practise': 'practice', 'practicing': 'practice',
+            'workout': 'fitness', 'exercise': 'fitness', 'exam': 'exams', 'test': 'exams',
+            'tests': 'exams', 'coding': 'programming'}
+
+# Spelled-out durations are folded into a common unit so "3 months" ~ "90 days"
+DURATIONS = {'day': 1, 'days': 1, 'week': 7, 'weeks': 7, 'month': 30, 'months': 30,
+             'year': 365, 'years': 365}
+
+
+def goal_duration(terms):
+    """The set of duration features in a goal's terms"""
+    return frozenset(t for t in terms if t.startswith('dur:'))
+
+
+def goal_terms(goal):
+    """Split a goal into the word, bigram and character trigram features we hash"""
+    words = re.findall(r"[a-z0-9+#]+", goal.lower())
+
+    terms = []
+    kept = []
+    i = 0
+    while i < len(words):
+        word = words[i]
+        if word.isdigit() and i + 1 < len(words) and words[i + 1] in DURATIONS:
+            days = int(word) * DURATIONS[words[i + 1]]
+            terms.append(f"dur:{days // 30 or 1}")
+            i += 2
+            continue
+        if word not in STOPWORDS:
+            kept.append(SYNONYMS.get(word, word))
+        i += 1
+
+    terms.extend(f"w:{w}" for w in kept)
+    terms.extend(f"b:{a}_{b}" for a, b in zip(kept, kept[1:]))
+    for word in kept:
+        padded = f"^{word}$"
+        terms.extend(f"c:{padded[j:j + 3]}" for j in range(len(padded) - 2))
+    return terms
+
+
+class GoalIndex:
+    """TF-IDF vectors of hashed goal features, searched by cosine similarity
+
+    Each indexed goal points at the cache key of its plan. Goals are kept
+    in a small SQLite table when a path is given, so the index is rebuilt
+    from text on startup without calling the model again.
+    """
+
+    def __init__(self, path=None, dimensions=2 ** 12, table='goal_index'):
+        # numpy is imported where it is used, so modules that only need
+        # goal_terms or STOPWORDS don't pay for it at startup
+        import numpy as np
+
+        self.dimensions = dimensions
+        self.table = table
+
+        self.keys = []
+        self.goals = []
+        self.namespaces = []
+        self.durations = []
+        # Rows beyond len(self.keys) are spare capacity, so adds don't copy the matrix
+        self._counts = np.zeros((16, dimensions), dtype=np.float32)
+        self._doc_freq = np.zeros(dimensions, dtype=np.float32)
+        self._weighted = None
+        self._lock = threading.Lock()
+
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    goal TEXT NOT NULL
+                )
+            """)
+            self._db.commit()
+            rows = self._db.execute(f"SELECT key, namespace, goal FROM {table}").fetchall()
+            for key, namespace, goal in rows:
+                self._append(key, namespace, goal)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def vectorize(self, goal, terms=None):
+        """Hashed, log-scaled term counts for one goal"""
+        import numpy as np
+
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for term in goal_terms(goal) if terms is None else terms:
+            vector[zlib.crc32(term.encode('utf-8')) % self.dimensions] += 1.0
+        return np.log1p(vector)
+
+    def add(self, goal, key, namespace=''):
+        """Index a goal whose plan is cached under key"""
+        with self._lock:
+            if key in self.keys:
+                return
+            self._append(key, namespace, goal)
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)",
+                    (key, namespace, goal)
+                )
+                self._db.commit()
+
+    def remove(self, key):
+        """Drop a goal, e.g. once its plan has fallen out of the cache"""
+        with self._lock:
+            self._drop([i for i, k in enumerate(self.keys) if k == key])
+
+    def invalidate(self, keep_namespace):
+        """Drop every goal that does not belong to keep_namespace"""
+        with self._lock:
+            self._drop([i for i, ns in enumerate(self.namespaces) if ns != keep_namespace])
+
+    def search(self, goal, threshold=0.8):
+        """Return (key, matched_goal, score) for the closest goal above threshold, or None"""
+        import numpy as np
+
+        with self._lock:
+            if not self.keys:
+                return None
+
+            if self._weighted is None:
+                counts = self._counts[:len(self.keys)]
+                self._weighted = self._normalize(counts * self._idf())
+            terms = goal_terms(goal)
+            query = self._normalize((self.vectorize(goal, terms) * self._idf())[None, :])[0]
+            if not query.any():
+                return None
+
+            scores = self._weighted @ query
+
+            # The same goal on a different timeline needs a different plan
+            duration = goal_duration(terms)
+            if duration:
+                for i, other in enumerate(self.durations):
+                    if other and other != duration:
+                        scores[i] = -1.0
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if score < threshold:
+                return None
+            return self.keys[best], self.goals[best], score
+
+    def _idf(self):
+        import numpy as np
+
+        return np.log((1.0 + len(self.keys)) / (1.0 + self._doc_freq)) + 1.0
+
+    @staticmethod
+    def _normalize(matrix):
+        import numpy as np
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _append(self, key, namespace, goal):
+        import numpy as np
+
+        terms = goal_terms(goal)
+        vector = self.vectorize(goal, terms)
+        row = len(self.keys)
+        if row == len(self._counts):
+            grown = np.zeros((2 * row, self.dimensions), dtype=np.float32)
+            grown[:row] = self._counts
+            self._counts = grown
+        self._counts[row] = vector
+        self.keys.append(key)
+        self.goals.append(goal)
+        self.namespaces.append(namespace)
+        self.durations.append(goal_duration(terms))
+        self._doc_freq += vector > 0
+        self._weighted = None
+
+    def _drop(self, positions):
+        import numpy as np
+
+        if not positions:
+            return
+        dropped = set(positions)
+        keep = [i for i in range(len(self.keys)) if i not in dropped]
+        if self._db is not None:
+            self._db.executemany(
+                f"DELETE FROM {self.table} WHERE key = ?",
+                [(self.keys[i],) for i in positions]
+            )
+            self._db.commit()
+        self.keys = [self.keys[i] for i in keep]
+        self.goals = [self.goals[i] for i in keep]
+        self.namespaces = [self.namespaces[i] for i in keep]
+        self.durations = [self.durations[i] for i in keep]
+        self._counts = np.concatenate([
+            self._counts[keep],
+            np.zeros((max(16, len(keep)), self.dimensions), dtype=np.float32)
+        ])
+        self._doc_freq = (self._counts > 0).sum(axis=0).astype(np.float32)
+        self._weighted = None
@@ -0,0 +1,360 @@
+"""
+One-pass classification of goals: learning style, research need and category
+
+    python intent.py classify goals.jsonl                  # tallies per style and category
+    python intent.py classify goals.csv --output intents.jsonl
+    python intent.py train goals.jsonl --model .cache/intent.npz
+
+Keywords are matched as whole words by a single precompiled regex, so "do"
+no longer matches "done" or "document". Goals that name no category
+keyword can be categorized by a hashed-feature linear model, trained with
+`train` on labelled goals (a "category" column) or, failing that, on the
+goals the keywords do categorize. The app loads it from INTENT_MODEL_PATH.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import re
+import sys
+import zlib
+from collections import Counter, namedtuple
+
+from goal_index import goal_terms
+
+# In priority order: the first style wins a tie
+LEARNING_STYLES = {
+    'visual': ['see', 'show', 'shown', 'visual', 'visually', 'picture', 'pictures', 'diagram', 'diagrams',
+               'video', 'videos', 'watch', 'watching'],
+    'auditory': ['hear', 'listen', 'listening', 'talk', 'talking', 'discuss', 'discussing', 'discussion',
+                 'podcast', 'podcasts'],
+    'kinesthetic': ['do', 'doing', 'practice', 'practise', 'practicing', 'hands-on', 'try', 'trying',
+                    'build', 'building']
+}
+
+# Goals mentioning any of these get an additional web research pass
+RESEARCH_KEYWORDS = ['learn', 'learns', 'learning', 'learned', 'learnt', 'research', 'researching',
+                     'study', 'studies', 'studying', 'studied', 'find', 'finding', 'resources']
+
+GOAL_CATEGORIES = {
+    'programming': ['python', 'javascript', 'java', 'rust', 'sql', 'code', 'coding', 'programming',
+                    'programmer', 'developer', 'software', 'website', 'app', 'algorithms'],
+    'fitness': ['fitness', 'workout', 'exercise', 'gym', 'run', 'running', 'marathon', 'strength',
+                'yoga', 'muscle', 'weight', 'swim', 'swimming'],
+    'exams': ['exam', 'exams', 'finals', 'test', 'tests', 'sat', 'gre', 'gmat', 'certification', 'revise'],
+    'languages': ['spanish', 'french', 'german', 'italian', 'japanese', 'chinese', 'mandarin', 'korean',
+                  'english', 'language', 'languages', 'fluent', 'fluency', 'vocabulary'],
+    'music': ['guitar', 'piano', 'violin', 'drums', 'sing', 'singing', 'music', 'song', 'songs'],
+    'career': ['job', 'career', 'interview', 'interviews', 'resume', 'cv', 'promotion', 'salary',
+               'portfolio', 'business'],
+    'creative': ['draw', 'drawing', 'paint', 'painting', 'write', 'writing', 'novel', 'photography',
+                 'design', 'knit', 'knitting'],
+    'finance': ['money', 'budget', 'budgeting', 'save', 'saving', 'savings', 'invest', 'investing',
+                'debt', 'retirement']
+}
+
+Intent = namedtuple('Intent', ['learning_style', 'needs_research', 'category'])
+
+
+def keyword_regex(words):
+    """A regex source matching any of `words`, factored into a trie
+
+    Python's re tries alternatives one by one, so sharing prefixes
+    ("learn|learning|learned" -> "learn(?:ed|ing)?") roughly halves the
+    time a scan takes compared with a flat alternation.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = None
+
+    def branch(node):
+        branches = [re.escape(char) + branch(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')' + ('?' if '' in node else '')
+
+    return branch(trie)
+
+
+class IntentClassifier:
+    """Learning style, research need and category of a goal from one regex scan
+
+    Every keyword of every kind is folded into one regex, anchored so it
+    only matches whole words (hyphens count as part of a word). Each
+    match is looked up in a dict of what it votes for.
+    `model`, a LinearIntentModel, categorizes goals no keyword covers.
+    """
+
+    def __init__(self, styles=LEARNING_STYLES, research_keywords=RESEARCH_KEYWORDS,
+                 categories=GOAL_CATEGORIES, model=None):
+        self.model = model
+        self._votes = {}
+        for style, keywords in styles.items():
+            self._add(keywords, 'style', style)
+        self._add(research_keywords, 'research', True)
+        for category, keywords in categories.items():
+            self._add(keywords, 'category', category)
+        self._style_rank = {style: rank for rank, style in enumerate(styles)}
+        self._category_rank = {category: rank for rank, category in enumerate(categories)}
+
+        self._pattern = re.compile(r"(?<![\w-])" + keyword_regex(self._votes) + r"(?![\w-])")
+
+    def _add(self, keywords, kind, label):
+        for keyword in keywords:
+            self._votes.setdefault(keyword.lower(), []).append((kind, label))
+
+    def classify(self, text):
+        """The Intent of one goal"""
+        intent = self._match(text)
+        if intent.category is None and self.model is not None:
+            intent = intent._replace(category=self.model.predict([text])[0])
+        return intent
+
+    def classify_many(self, texts, chunk_size=4096):
+        """Intents for many goals, in order, yielded lazily
+
+        The keyword scan runs per goal; goals left uncategorized are sent
+        to the model `chunk_size` at a time, as one matrix product each.
+        """
+        chunk = []
+        for text in texts:
+            chunk.append((text, self._match(text)))
+            if len(chunk) >= chunk_size:
+                yield from self._categorize(chunk)
+                chunk = []
+        if chunk:
+            yield from self._categorize(chunk)
+
+    def _categorize(self, chunk):
+        if self.model is None:
+            return [intent for _, intent in chunk]
+        missing = [i for i, (_, intent) in enumerate(chunk) if intent.category is None]
+        intents = [intent for _, intent in chunk]
+        if missing:
+            for i, category in zip(missing, self.model.predict([chunk[i][0] for i in missing])):
+                intents[i] = intents[i]._replace(category=category)
+        return intents
+
+    def _match(self, text):
+        words = self._pattern.findall(text.lower())
+        if not words:
+            return Intent(None, False, None)
+
+        styles = {}
+        categories = {}
+        research = False
+        for word in words:
+            for kind, label in self._votes[word]:
+                if kind == 'style':
+                    styles[label] = styles.get(label, 0) + 1
+                elif kind == 'category':
+                    categories[label] = categories.get(label, 0) + 1
+                else:
+                    research = True
+        return Intent(self._winner(styles, self._style_rank), research,
+                      self._winner(categories, self._category_rank))
+
+    @staticmethod
+    def _winner(votes, rank):
+        """The label with the most votes, ties going to the one listed first"""
+        if len(votes) < 2:
+            return next(iter(votes), None)
+        return max(votes, key=lambda label: (votes[label], -rank[label]))
+
+
+class LinearIntentModel:
+    """Softmax regression over the hashed goal_terms features GoalIndex uses"""
+
+    def __init__(self, labels, weights, bias, min_confidence=0.5):
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.dimensions = weights.shape[0]
+        self.min_confidence = min_confidence
+
+    @staticmethod
+    def features(texts, dimensions):
+        """Log-scaled hashed term counts, one row per text"""
+        import numpy as np
+
+        rows, columns = [], []
+        for row, text in enumerate(texts):
+            for term in goal_terms(text):
+                rows.append(row)
+                columns.append(zlib.crc32(term.encode('utf-8')) % dimensions)
+        matrix = np.zeros((len(texts), dimensions), dtype=np.float32)
+        np.add.at(matrix, (rows, columns), 1.0)
+        return np.log1p(matrix, out=matrix)
+
+    def probabilities(self, texts):
+        import numpy as np
+
+        scores = self.features(texts, self.dimensions) @ self.weights + self.bias
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    def predict(self, texts):
+        """The most likely label per text, or None when below min_confidence"""
+        if not texts:
+            return []
+        probabilities = self.probabilities(texts)
+        best = probabilities.argmax(axis=1)
+        return [
+            self.labels[label] if probabilities[row, label] >= self.min_confidence else None
+            for row, label in enumerate(best)
+        ]
+
+    @classmethod
+    def fit(cls, texts, labels, dimensions=2 ** 12, epochs=30, learning_rate=0.5,
+            batch_size=1024, l2=1e-4, seed=0):
+        """Train on texts and their labels with minibatch gradient descent"""
+        import numpy as np
+
+        names = sorted(set(labels))
+        targets = np.array([names.index(label) for label in labels])
+        weights = np.zeros((dimensions, len(names)), dtype=np.float32)
+        bias = np.zeros(len(names), dtype=np.float32)
+        model = cls(names, weights, bias)
+
+        # Hash every text once; only the order of the batches changes per epoch
+        batches = [
+            (cls.features(texts[start:start + batch_size], dimensions), targets[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ]
+        random = np.random.default_rng(seed)
+        for _ in range(epochs):
+            for index in random.permutation(len(batches)):
+                features, batch_targets = batches[index]
+                scores = features @ weights + bias
+                scores -= scores.max(axis=1, keepdims=True)
+                np.exp(scores, out=scores)
+                scores /= scores.sum(axis=1, keepdims=True)
+                scores[np.arange(len(batch_targets)), batch_targets] -= 1.0
+                scores /= len(batch_targets)
+                weights -= learning_rate * (features.T @ scores + l2 * weights)
+                bias -= learning_rate * scores.sum(axis=0)
+        return model
+
+    def save(self, path):
+        import numpy as np
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(f, labels=np.array(self.labels), weights=self.weights, bias=self.bias)
+
+    @classmethod
+    def load(cls, path, min_confidence=0.5):
+        import numpy as np
+
+        with np.load(path) as data:
+            return cls([str(label) for label in data['labels']], data['weights'], data['bias'],
+                       min_confidence)
+
+
+def model_path():
+    return os.getenv('INTENT_MODEL_PATH', os.path.join('.cache', 'intent.npz'))
+
+
+def open_intent_classifier():
+    """The keyword classifier, plus the model at INTENT_MODEL_PATH if one was trained"""
+    path = model_path()
+    model = None
+    if os.path.exists(path):
+        try:
+            model = LinearIntentModel.load(path)
+        except Exception as e:
+            print(f"⚠️ Could not load the intent model at {path}: {e}")
+    return IntentClassifier(model=model)
+
+
+def read_labelled(path):
+    """(goal, category or None) pairs from a .jsonl, .csv or plain text file"""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8') as f:
+        if extension == '.csv':
+            for row in csv.DictReader(f):
+                if row.get('goal', '').strip():
+                    yield row['goal'].strip(), row.get('category') or None
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if extension == '.jsonl':
+                record = json.loads(line)
+                if isinstance(record, str):
+                    yield record, None
+                else:
+                    yield record['goal'], record.get('category')
+            else:
+                yield line, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify goals by learning style, research need and category")
+    parser.add_argument('--model', default=model_path(), help="linear category model file")
+    commands = parser.add_subparsers(dest='command', required=True)
+    classify = commands.add_parser('classify', help="classify every goal in a JSONL, CSV or text file")
+    classify.add_argument('file')
+    classify.add_argument('--output', help="also write each goal's id and intent to this JSONL file")
+    train = commands.add_parser('train', help="train the category model on a JSONL, CSV or text file")
+    train.add_argument('file')
+    train.add_argument('--epochs', type=int, default=30)
+    args = parser.parse_args(argv)
+
+    if args.command == 'train':
+        keywords = IntentClassifier()
+        texts, labels = [], []
+        for goal, category in read_labelled(args.file):
+            # Unlabelled goals are labelled by their keywords, when they have any
+            category = category or keywords.classify(goal).category
+            if category:
+                texts.append(goal)
+                labels.append(category)
+        if len(set(labels)) < 2:
+            print("⚠️ Need goals from at least two categories to train")
+            return 1
+        LinearIntentModel.fit(texts, labels, epochs=args.epochs).save(args.model)
+        print(f"✅ Trained on {len(texts)} goals in {len(set(labels))} categories, saved to {args.model}")
+        return 0
+
+    from batch import read_goals
+
+    model = LinearIntentModel.load(args.model) if os.path.exists(args.model) else None
+    classifier = IntentClassifier(model=model)
+    ids, goals = itertools.tee(read_goals(args.file))
+    intents = zip((goal_id for goal_id, _ in ids), classifier.classify_many(goal for _, goal in goals))
+    styles, categories = Counter(), Counter()
+    total = research = 0
+    out = open(args.output, 'w', encoding='utf-8') if args.output else None
+    try:
+        for goal_id, intent in intents:
+            total += 1
+            research += intent.needs_research
+            styles[intent.learning_style or 'none'] += 1
+            categories[intent.category or 'other'] += 1
+            if out is not None:
+                out.write(json.dumps({'id': goal_id, **intent._asdict()}) + '\n')
+    finally:
+        if out is not None:
+            out.close()
+
+    print(f"📊 {total} goals, {research} would get web research")
+    for title, counts in (("Learning styles", styles), ("Categories", categories)):
+        print(f"\n{title}:")
+        for label, count in counts.most_common():
+            print(f"  {label:<14}{count:>8}  {count / total:.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Background plan generation for the Streamlit UI
+
+A goal submitted here keeps generating when the script that submitted it
+reruns, so the UI stays responsive and only has to poll the job by id.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+
+class PlanJob:
+    """One goal planned on a worker thread
+
+    Only the worker writes to a job, so the UI can read its stage and the
+    markdown streamed so far at any time without locking.
+    """
+
+    __slots__ = ('id', 'user_id', 'goal', 'stage', 'text', 'plan', 'error',
+                 'submitted_at', 'finished_at')
+
+    def __init__(self, user_id, goal):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.goal = goal
+        self.stage = None
+        self.text = ''
+        self.plan = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def set_stage(self, stage):
+        self.stage = stage
+
+
+class PlanJobs:
+    """Runs PlannerAgent.stream_goal for submitted goals on a thread pool
+
+    Finished jobs are kept for `retention` seconds (and at most `max_jobs`
+    jobs overall) so a rerun or a reloaded page can still pick them up.
+    """
+
+    def __init__(self, workers=8, retention=3600, max_jobs=1000):
+        self.retention = retention
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='plan-job')
+
+    def submit(self, agent, goal):
+        """Start planning `goal` with `agent` and return its PlanJob at once"""
+        job = PlanJob(agent.teacher.user_id, goal)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, agent)
+        metrics.incr('plan_jobs', status='submitted')
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def for_user(self, user_id):
+        """The user's retained jobs, oldest first"""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.user_id == user_id]
+
+    def stats(self):
+        with self._lock:
+            running = sum(not job.done for job in self._jobs.values())
+            return {'running': running, 'retained': len(self._jobs)}
+
+    def _run(self, job, agent):
+        try:
+            with metrics.span('plan_job'):
+                stream = agent.stream_goal(job.goal, on_progress=job.set_stage)
+                while True:
+                    try:
+                        job.text += next(stream)
+                    except StopIteration as finished:
+                        job.plan = finished.value
+                        break
+            if job.plan is not None and job.plan.error:
+                job.error = job.plan.error
+        except Exception as e:
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            metrics.incr('plan_jobs', status='failed' if job.error else 'finished')
+
+    def _prune(self):
+        """Forget expired finished jobs, then the oldest finished ones over max_jobs"""
+        expired = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < expired]:
+            del self._jobs[job_id]
+        if len(self._jobs) >= self.max_jobs:
+            finished = [job_id for job_id, job in self._jobs.items() if job.done]
+            for job_id in finished[:len(self._jobs) - self.max_jobs + 1]:
+                del self._jobs[job_id]
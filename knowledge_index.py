@@ -0,0 +1,171 @@
+"""
+Offline knowledge index of courses, books and docs, backed by SQLite FTS5
+
+    python knowledge_index.py add corpus.json      # or corpus.csv
+    python knowledge_index.py remove https://example.com/course
+    python knowledge_index.py search "learn python"
+
+The index lives in one SQLite file (KNOWLEDGE_INDEX_PATH), so it is
+queried straight from disk at startup with nothing to rebuild.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+from goal_index import STOPWORDS
+from research_engine import ResearchProvider
+
+# BM25 column weights for title, description and tags
+COLUMN_WEIGHTS = (3.0, 1.0, 2.0)
+
+
+def read_entries(path):
+    """Load resource entries from a JSON list or a CSV file
+
+    Entries need "title" and "link"; "kind" (course, book, doc...),
+    "description" and "tags" are optional. CSV tags are separated by ';'.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            entries = []
+            for row in csv.DictReader(f):
+                row['tags'] = [t.strip() for t in (row.get('tags') or '').split(';') if t.strip()]
+                entries.append(row)
+            return entries
+        return json.load(f)
+
+
+class KnowledgeIndex:
+    """BM25-ranked full text search over resource entries, with incremental updates"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA mmap_size = 268435456")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS resources (
+                id TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL,
+                link TEXT NOT NULL,
+                kind TEXT,
+                description TEXT,
+                tags TEXT
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS resources_fts USING fts5(
+                title, description, tags, content='resources', content_rowid='rowid'
+            );
+            CREATE TRIGGER IF NOT EXISTS resources_added AFTER INSERT ON resources BEGIN
+                INSERT INTO resources_fts (rowid, title, description, tags)
+                VALUES (new.rowid, new.title, new.description, new.tags);
+            END;
+            CREATE TRIGGER IF NOT EXISTS resources_removed AFTER DELETE ON resources BEGIN
+                INSERT INTO resources_fts (resources_fts, rowid, title, description, tags)
+                VALUES ('delete', old.rowid, old.title, old.description, old.tags);
+            END;
+        """)
+        self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
+
+    def add(self, entries):
+        """Add or replace entries; an entry's id defaults to its link"""
+        rows = [(
+            str(entry.get('id') or entry['link']),
+            entry['title'],
+            entry['link'],
+            entry.get('kind'),
+            entry.get('description', ''),
+            ' '.join(entry.get('tags', []))
+        ) for entry in entries]
+        # An id listed twice keeps its last entry, like a later add() would
+        rows = list({row[0]: row for row in rows}.values())
+        with self._lock:
+            # Delete first so the FTS trigger removes the old text too
+            self._db.executemany("DELETE FROM resources WHERE id = ?", [(r[0],) for r in rows])
+            self._db.executemany(
+                "INSERT INTO resources (id, title, link, kind, description, tags) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+        return len(rows)
+
+    def remove(self, entry_id):
+        """Remove an entry by id, returning whether it existed"""
+        with self._lock:
+            removed = self._db.execute("DELETE FROM resources WHERE id = ?", (entry_id,)).rowcount
+            self._db.commit()
+        return bool(removed)
+
+    def search(self, query, limit=3):
+        """Best matching entries for a free-text query, best first"""
+        words = [w for w in re.findall(r'\w+', query.lower()) if w not in STOPWORDS]
+        if not words:
+            return []
+        match = ' OR '.join(f'"{word}"' for word in words)
+        with self._lock:
+            rows = self._db.execute(f"""
+                SELECT r.id, r.title, r.link, r.kind, r.description
+                FROM resources_fts JOIN resources r ON r.rowid = resources_fts.rowid
+                WHERE resources_fts MATCH ?
+                ORDER BY bm25(resources_fts, {', '.join(map(str, COLUMN_WEIGHTS))})
+                LIMIT ?
+            """, (match, limit)).fetchall()
+        return [
+            {'id': r[0], 'title': r[1], 'link': r[2], 'kind': r[3], 'description': r[4]}
+            for r in rows
+        ]
+
+
+class KnowledgeIndexProvider(ResearchProvider):
+    """Research provider answering from a local KnowledgeIndex"""
+
+    name = 'knowledge'
+
+    def __init__(self, index):
+        self.index = index
+
+    async def search(self, query, limit):
+        return [{'title': r['title'], 'link': r['link']} for r in self.index.search(query, limit)]
+
+
+def index_path():
+    return os.getenv('KNOWLEDGE_INDEX_PATH', os.path.join('.cache', 'knowledge.sqlite3'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the offline resource index")
+    parser.add_argument('--index', default=index_path(), help="index file")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('add', help="add entries from a JSON or CSV file").add_argument('file')
+    commands.add_parser('remove', help="remove an entry by id").add_argument('id')
+    search = commands.add_parser('search', help="search the index")
+    search.add_argument('query')
+    search.add_argument('--limit', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    index = KnowledgeIndex(args.index)
+    if args.command == 'add':
+        print(f"✅ Indexed {index.add(read_entries(args.file))} entries ({len(index)} total)")
+    elif args.command == 'remove':
+        if not index.remove(args.id):
+            print(f"⚠️ No entry with id {args.id}")
+            return 1
+        print(f"🗑️ Removed {args.id}")
+    else:
+        for result in index.search(args.query, args.limit):
+            print(f"• {result['title']} — {result['link']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,70 @@
+import datetime
+import json
 import os
-import google.generativeai as genai
+import re
+import threading
+import time
 from dotenv import load_dotenv
-import requests
-from bs4 import BeautifulSoup
+from cache import ResponseCache, make_key
+from context_builder import EMPTY_CONTEXT, ContextBuilder
+from goal_index import GoalIndex
+from intent import IntentClassifier
+from memory_store import InMemoryStore
+from metrics import metrics
+from plan_model import PLAN_SCHEMA, REVISION_SCHEMA, Plan, PlanStream, affected_steps, load_plan
+from scheduler import RequestScheduler, estimate_tokens
 
 # Load environment variables
 load_dotenv()
 
+# Models shared by every teacher in the process. Maps (model name,
+# system instruction or None) to (model, monotonic expiry time or None).
+# Each key also gets its own lock, held while its model is being created,
+# so a slow creation never blocks teachers that need other models
+_shared_models = {}
+_shared_models_lock = threading.Lock()
+_model_locks = {}
+_configured_api_key = None
+
+
+def configure_gemini():
+    """Configure the Gemini client once per process and return the API key"""
+    global _configured_api_key
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise ValueError("Please set GEMINI_API_KEY in your .env file")
+    
+    with _shared_models_lock:
+        if api_key != _configured_api_key:
+            # The SDK is slow to import, so it is only loaded once a model is needed
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+            _shared_models.clear()
+    return api_key
+
+
 class GeminiTeacher:
-    def __init__(self):
+    # Plain teachers don't track the student's learning style; EnhancedTeacher does
+    learning_style = None
+    
+    def __init__(self, memory=None, user_id='default', summarizer=None):
         # Configure Gemini
-        self.api_key = os.getenv('GEMINI_API_KEY')
-        if not self.api_key:
-            raise ValueError("Please set GEMINI_API_KEY in your .env file")
-        
-        genai.configure(api_key=self.api_key)
+        self.api_key = configure_gemini()
         
         # Create the model with teacher personality
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.model_name = 'gemini-2.0-flash'
+        self.model = self.instructed_model(None)
         
-        # Memory storage
-        self.conversation_history = []
+        # Memory storage, kept per user in a MemoryStore backend
+        self.memory = memory or InMemoryStore()
+        self.user_id = user_id
+        self.context_builder = ContextBuilder(
+            budget_tokens=int(os.getenv('CONTEXT_TOKEN_BUDGET', 1200))
+        )
+        self._context_synced = False
+        # Optional PlanSummarizer that condenses stored plans off the response path
+        self.summarizer = summarizer
         self.user_preferences = {}
         
         # Teacher persona
@@ -42,124 +86,598 @@ class GeminiTeacher:
         5. Offer encouragement
         """
     
+    def persona(self, learning_style=None):
+        """The persona for system instructions, adapted to a learning style by subclasses"""
+        return self.teacher_persona
+    
+    def instructed_model(self, system_instruction):
+        """Get the shared model carrying system_instruction, created once per process
+        
+        By default the instruction is attached as a plain system instruction,
+        which the SDK sends again with every request, so this saves building
+        models but not input tokens. Only with GEMINI_CONTEXT_CACHE=1, and
+        only if the instruction meets the API's caching token minimum, is it
+        uploaded once as cached content (re-created when it expires) and left
+        out of each request. Otherwise the API refuses the cache and the
+        plain system instruction is used. Passing None gives the bare model.
+        """
+        key = (self.model_name, system_instruction)
+        with _shared_models_lock:
+            model = self._live_model(key)
+            if model is not None:
+                return model
+            key_lock = _model_locks.setdefault(key, threading.Lock())
+        
+        with key_lock:
+            # Another thread may have created it while this one waited
+            with _shared_models_lock:
+                model = self._live_model(key)
+            if model is None:
+                model, expires_at = self._create_model(system_instruction)
+                with _shared_models_lock:
+                    _shared_models[key] = (model, expires_at)
+            return model
+    
+    @staticmethod
+    def _live_model(key):
+        """The shared model for key unless it is missing or expired; hold _shared_models_lock"""
+        model, expires_at = _shared_models.get(key, (None, None))
+        if expires_at is not None and time.monotonic() >= expires_at:
+            return None
+        return model
+    
+    def _create_model(self, system_instruction):
+        import google.generativeai as genai
+        
+        if system_instruction is not None and os.getenv('GEMINI_CONTEXT_CACHE') == '1':
+            ttl = int(os.getenv('GEMINI_CONTEXT_CACHE_TTL', 3600))
+            try:
+                cached = genai.caching.CachedContent.create(
+                    model=f"models/{self.model_name}",
+                    system_instruction=system_instruction,
+                    ttl=datetime.timedelta(seconds=ttl)
+                )
+                # Refresh a little early so no request races the server-side expiry
+                return genai.GenerativeModel.from_cached_content(cached), time.monotonic() + ttl * 0.9
+            except Exception as e:
+                print(f"⚠️ Context caching unavailable, using a system instruction: {e}")
+        return genai.GenerativeModel(self.model_name, system_instruction=system_instruction), None
+    
+    @property
+    def conversation_history(self):
+        """This user's retained exchanges, oldest first (the last 20)"""
+        return self.memory.recent(self.user_id)
+    
     def add_to_memory(self, user_input, assistant_response):
         """Store conversation in memory"""
-        self.conversation_history.append({
-            'user': user_input,
-            'assistant': assistant_response,
-            'timestamp': len(self.conversation_history)
-        })
-        
-        # Keep only last 20 messages to manage context
-        if len(self.conversation_history) > 20:
-            self.conversation_history = self.conversation_history[-20:]
+        # The store keeps only the last 20 messages to manage context
+        with metrics.span('memory_update'):
+            entry = self.memory.append(self.user_id, user_input, assistant_response)
+        if self._context_synced:
+            self.context_builder.add(entry)
+        if self.summarizer is not None:
+            self.summarizer.submit(self.memory, self.user_id, entry,
+                                   on_done=self.context_builder.set_summary)
+        return entry
     
     def get_context(self):
-        """Get recent conversation context"""
-        if not self.conversation_history:
-            return "No previous conversation."
-        
-        context = "Recent conversation:\n"
-        for msg in self.conversation_history[-5:]:  # Last 5 exchanges
-            context += f"Student: {msg['user']}\n"
-            context += f"Teacher: {msg['assistant']}\n"
-        return context
+        """Get recent conversation context, kept within the context token budget"""
+        # Another session for the same user may have written to the store
+        latest = self.memory.recent(self.user_id, 1)
+        latest_id = latest[0]['id'] if latest else None
+        if not self._context_synced or latest_id != self.context_builder.last_id:
+            self.context_builder.load(self.memory.recent(self.user_id, 5))  # Last 5 exchanges
+            self._context_synced = True
+        return self.context_builder.build()
+
+# Every plan that failed to generate starts with this
+PLAN_ERROR_PREFIX = "I encountered an error while planning"
+REVISION_ERROR_PREFIX = "I encountered an error while revising the plan"
+
+# Stages reported to on_progress callbacks, in the order they happen
+PROGRESS_STAGES = ['prompt_built', 'model_call_started', 'first_token', 'research_done', 'merged']
+
+
+def report_progress(on_progress, stage):
+    """Tell an optional progress callback that a planning stage was reached"""
+    if on_progress is not None:
+        on_progress(stage)
+
+
+def record_usage(response):
+    """Count a response's prompt and output tokens; returns its usage metadata"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        metrics.incr('tokens', getattr(usage, 'prompt_token_count', 0) or 0, kind='prompt')
+        metrics.incr('tokens', getattr(usage, 'candidates_token_count', 0) or 0, kind='output')
+    return usage
+
+
+def normalize_goal(user_goal):
+    """Reduce a goal to a canonical form so trivially different wordings share a cache entry"""
+    goal = re.sub(r'\s+', ' ', user_goal.lower()).strip()
+    return goal.rstrip('.!?')
+
+
+def plan_cache_path():
+    return os.getenv('PLAN_CACHE_PATH', os.path.join('.cache', 'plans.sqlite3'))
+
+
+def open_plan_cache():
+    """Open the on-disk plan cache configured by PLAN_CACHE_PATH"""
+    return ResponseCache(
+        plan_cache_path(),
+        table='plans',
+        ttl=float(os.getenv('PLAN_CACHE_TTL', 7 * 24 * 3600))
+    )
+
+
+def create_scheduler():
+    """Scheduler for Gemini calls, sized by GEMINI_MAX_IN_FLIGHT, GEMINI_RPM and GEMINI_TPM"""
+    return RequestScheduler(
+        max_in_flight=int(os.getenv('GEMINI_MAX_IN_FLIGHT', 4)),
+        requests_per_minute=int(os.getenv('GEMINI_RPM', 60)),
+        tokens_per_minute=int(os.getenv('GEMINI_TPM', 1000000))
+    )
+
+
+def open_goal_index():
+    """Open the similarity index of cached goals, stored next to the plan cache"""
+    return GoalIndex(plan_cache_path())
+
 
 class PlanningSystem:
-    def __init__(self, gemini_teacher):
+    # Output tokens we reserve against the TPM limit before we know the real count
+    expected_plan_tokens = 1500
+    expected_revision_tokens = 400
+    
+    def __init__(self, gemini_teacher, cache=None, goal_index=None, scheduler=None):
         self.teacher = gemini_teacher
+        
+        # Optional RequestScheduler that every model call goes through
+        self.scheduler = scheduler
+        
+        # Optional ResponseCache of finished plans
+        self.cache = cache
+        self._fingerprint = None
+        
+        # Optional GoalIndex so paraphrased goals reuse a cached plan.
+        # near_duplicate_mode is 'reuse', 'adapt' (reuse with a note) or 'off'
+        self.goal_index = goal_index
+        self.similarity_threshold = float(os.getenv('PLAN_SIMILARITY_THRESHOLD', 0.75))
+        self.near_duplicate_mode = os.getenv('PLAN_SIMILARITY_MODE', 'reuse')
+    
+    def plan_instructions(self, learning_style=None):
+        """The static part of every planning request: persona and plan template"""
+        return f"""
+        {self.teacher.persona(learning_style)}
+        
+        For every goal the student shares, create a comprehensive plan as JSON:
+        
+        analysis:
+        - summary: understanding what the student wants to achieve
+        - importance: why this goal is important
+        - challenges: potential challenges
+        
+        steps: a step-by-step plan, each step with
+        - title: step description
+        - reasoning: why this step is important
+        - time: estimated time
+        - resources: resources needed
+        - success_criteria: how the student knows the step is done
+        
+        research: mention if web research would be helpful for any step
+        
+        notes (teacher's notes):
+        - encouragement
+        - tips: tips for success
+        - focus: what to focus on
+        
+        Remember to be supportive and use teaching analogies!
+        """
+    
+    # Ask for JSON that fits plan_model.PLAN_SCHEMA instead of free-form markdown
+    generation_config = {'response_mime_type': 'application/json', 'response_schema': PLAN_SCHEMA}
+    
+    def plan_model(self, learning_style=None):
+        """Model carrying the plan instructions, created once per process and learning style"""
+        return self.teacher.instructed_model(self.plan_instructions(learning_style))
     
-    def create_structured_plan(self, user_goal):
-        """Create a detailed plan for the user's goal"""
+    def generate(self, prompt, model=None, generation_config=None, expected_tokens=None,
+                 learning_style=None):
+        """Call the plan model (or another one), through the scheduler when there is one"""
+        model = model or self.plan_model(learning_style)
+        generation_config = generation_config or self.generation_config
+        if self.scheduler is None:
+            response = model.generate_content(prompt, generation_config=generation_config)
+            record_usage(response)
+            return response
         
-        # Build the prompt with memory and persona
-        prompt = f"""
+        # Identical prompts in flight at the same time share a single call
+        tokens = estimate_tokens(prompt) + (expected_tokens or self.expected_plan_tokens)
+        response, owned = self.scheduler.call(
+            lambda: model.generate_content(prompt, generation_config=generation_config),
+            key=make_key(self.fingerprint(learning_style), prompt),
+            tokens=tokens
+        )
+        # Only the caller that sent the request pays for it
+        if owned:
+            usage = record_usage(response)
+            if usage is not None and getattr(usage, 'total_token_count', 0):
+                self.scheduler.tokens.adjust(usage.total_token_count - tokens)
+        return response
+    
+    def generate_stream(self, prompt, learning_style=None):
+        """Stream from the plan model, through the scheduler when there is one"""
+        model = self.plan_model(learning_style)
+        if self.scheduler is None:
+            return model.generate_content(prompt, stream=True, generation_config=self.generation_config)
+        return self.scheduler.stream(
+            lambda: model.generate_content(prompt, stream=True, generation_config=self.generation_config),
+            tokens=estimate_tokens(prompt) + self.expected_plan_tokens
+        )
+    
+    def revision_instructions(self):
+        """The static part of every revision request"""
+        return f"""
         {self.teacher.teacher_persona}
         
-        Context: {self.teacher.get_context()}
+        The student wants to change a plan you already wrote. You get the plan's
+        outline, the full text of the steps the change is most likely about, and
+        the change they asked for. Reply with only what changes, as JSON:
+        
+        changes: one entry per changed step, numbered as in the outline
+        - action "replace" with the fields that change (leave the rest out)
+        - action "remove" to drop the step
+        - action "add" with a full new step, placed after the given step (0 for first)
+        goal: the updated goal, if the change alters it
+        summary: an updated one-line analysis, if needed
+        
+        Leave out every step that stays the same.
+        """
+    
+    # Revisions come back as a patch fitting plan_model.REVISION_SCHEMA
+    revision_config = {'response_mime_type': 'application/json', 'response_schema': REVISION_SCHEMA}
+    
+    def build_revision_prompt(self, previous_plan, change_request):
+        """The previous plan's outline, the steps likely affected in full, and the change"""
+        affected = affected_steps(previous_plan, change_request)
+        details = '\n'.join(
+            f"{n}. {json.dumps(previous_plan.steps[n - 1].to_dict(), ensure_ascii=False)}"
+            for n in affected
+        )
+        return f"""
+        Goal: {previous_plan.goal}
+        
+        Plan outline:
+        {previous_plan.outline()}
+        
+        Affected steps:
+        {details or "(none named; judge from the outline)"}
+        
+        Change requested: {change_request}
+        """
+    
+    def revise_plan(self, previous_plan, change_request, use_cache=True, remember=True):
+        """Patch an existing Plan for a follow-up change instead of planning from scratch
+        
+        Only the outline and the affected steps go to the model, and only
+        the changed steps come back. A markdown plan has nothing to patch,
+        so it is written again in full instead (rewrite_plan). Returns a new
+        Plan; previous_plan is left untouched.
+        """
+        key = None
+        if self.cache is not None and use_cache:
+            key = make_key(self.fingerprint(), 'revision', previous_plan.to_json(), change_request)
+            cached = self.cache.get(key)
+            metrics.incr('revision_lookups', result='miss' if cached is None else 'hit')
+            if cached is not None:
+                plan = load_plan(previous_plan.goal, cached)
+                if remember:
+                    self.teacher.add_to_memory(plan.goal, plan.to_json())
+                return plan
+        
+        try:
+            with metrics.span('revise'):
+                if previous_plan.source_markdown is not None:
+                    plan = self.rewrite_plan(previous_plan, change_request)
+                else:
+                    response = self.generate(
+                        self.build_revision_prompt(previous_plan, change_request),
+                        model=self.teacher.instructed_model(self.revision_instructions()),
+                        generation_config=self.revision_config,
+                        expected_tokens=self.expected_revision_tokens
+                    )
+                    plan = previous_plan.revised(json.loads(response.text))
+        except Exception as e:
+            return Plan.failed(previous_plan.goal, f"{REVISION_ERROR_PREFIX}: {str(e)}")
+        
+        if remember:
+            self.teacher.add_to_memory(plan.goal, plan.to_json())
+        if key is not None:
+            self.cache.set(key, plan.to_dict(), namespace=self.fingerprint())
+        return plan
+    
+    def rewrite_plan(self, previous_plan, change_request):
+        """Write a markdown plan again as a full structured plan, with the change applied"""
+        prompt = self.build_prompt(previous_plan.goal) + f"""
+        Your earlier plan for this goal:
+        {previous_plan.source_markdown}
+        
+        Change requested: {change_request}
+        Write the whole plan again with this change applied.
+        """
+        return load_plan(previous_plan.goal, self.generate(prompt).text)
+    
+    def build_prompt(self, user_goal, context=None):
+        """Build the per-request part of the planning prompt: memory and goal"""
+        if context is None:
+            context = self.teacher.get_context()
+        return f"""
+        Context: {context}
         
         Student's Goal: {user_goal}
+        """
+    
+    def fingerprint(self, learning_style=None):
+        """Identify everything apart from goal and context that shapes a plan"""
+        return make_key(self.teacher.model_name, self.plan_instructions(learning_style),
+                        self.generation_config)
+    
+    def lookup_plan(self, user_goal, context, use_cache=True, learning_style=None):
+        """Return (plan, slot): a cached plan or None, and where to store a new one
         
-        Please create a comprehensive plan with this structure:
+        Plans written for a learning style are cached under their own keys
+        (but in the unstyled fingerprint's namespace, so they are kept when
+        the student's style changes) and only reused for the same goal.
+        On a miss, a student with a style still gets an unstyled plan for a
+        paraphrased goal, which PlannerAgent then personalizes with the
+        style's tip, rather than paying for a fresh model call.
+        """
+        if self.cache is None or not use_cache:
+            return None, None
         
-        🎯 GOAL ANALYSIS:
-        - Understanding what the student wants to achieve
-        - Why this goal is important
-        - Potential challenges
+        fingerprint = self.fingerprint()
+        if fingerprint != self._fingerprint:
+            # Persona, template or model changed, so older plans no longer apply
+            self.cache.invalidate(keep_namespace=fingerprint)
+            if self.goal_index is not None:
+                self.goal_index.invalidate(keep_namespace=fingerprint)
+            self._fingerprint = fingerprint
         
-        📝 STRUCTURED PLAN:
-        [Create a step-by-step plan with:
-        1. Step description
-        2. Reasoning why this step is important
-        3. Estimated time
-        4. Resources needed
-        5. Success criteria]
+        plan_fingerprint = self.fingerprint(learning_style) if learning_style else fingerprint
+        key = make_key(plan_fingerprint, normalize_goal(user_goal), context)
+        plan = self.cache.get(key)
+        if plan is None:
+            plan = self.lookup_similar_plan(user_goal)
+            metrics.incr('plan_lookups', result='miss' if plan is None else 'similar')
+        else:
+            plan = load_plan(user_goal, plan)
+            metrics.incr('plan_lookups', result='hit')
+        return plan, (fingerprint, key, user_goal, learning_style, context)
+    
+    def lookup_similar_plan(self, user_goal):
+        """Find a cached plan written for a paraphrase of this goal"""
+        if self.goal_index is None or self.near_duplicate_mode == 'off':
+            return None
         
-        🔍 ADDITIONAL RESEARCH:
-        [Mention if web research would be helpful for any step]
+        match = self.goal_index.search(user_goal, self.similarity_threshold)
+        if match is None:
+            return None
         
-        💡 TEACHER'S NOTES:
-        - Encouragement
-        - Tips for success
-        - What to focus on
+        key, matched_goal, _ = match
+        plan = self.cache.get(key)
+        if plan is None:
+            # The plan expired or was evicted, so the index entry is useless now
+            self.goal_index.remove(key)
+            return None
         
-        Remember to be supportive and use teaching analogies!
+        plan = load_plan(matched_goal, plan)
+        if self.near_duplicate_mode == 'adapt':
+            return self.adapt_plan(plan, matched_goal, user_goal)
+        return plan
+    
+    def adapt_plan(self, plan, matched_goal, user_goal):
+        """Lightly adapt a plan that was written for a similar goal"""
+        if normalize_goal(matched_goal) != normalize_goal(user_goal):
+            plan.note = (
+                f"I first wrote this plan for a similar goal: \"{matched_goal}\". "
+                f"Adjust the details to fit \"{user_goal}\"."
+            )
+        return plan
+    
+    def store_plan(self, slot, plan):
+        """Save a freshly generated plan in the cache slot from lookup_plan
+        
+        Only plans written without any conversation history are offered to
+        paraphrased goals: the index is shared by every student and never
+        looks at context, so anything else could hand one student's
+        history to another.
+        """
+        if slot is not None:
+            fingerprint, key, user_goal, learning_style, context = slot
+            self.cache.set(key, plan.to_dict(), namespace=fingerprint)
+            if self.goal_index is not None and not learning_style and context == EMPTY_CONTEXT:
+                self.goal_index.add(user_goal, key, namespace=fingerprint)
+    
+    def create_structured_plan(self, user_goal, on_progress=None, use_cache=True, remember=True):
+        """Create a detailed plan for the user's goal and return it as a Plan
+        
+        With remember=False the plan ignores and doesn't touch the
+        conversation memory or the student's learning style, which is what
+        independent batch goals need.
         """
         
+        learning_style = self.teacher.learning_style if remember else None
+        with metrics.span('context'):
+            context = self.teacher.get_context() if remember else EMPTY_CONTEXT
+        with metrics.span('cache_lookup'):
+            cached, slot = self.lookup_plan(user_goal, context, use_cache, learning_style)
+        if cached is not None:
+            report_progress(on_progress, 'prompt_built')
+            report_progress(on_progress, 'first_token')
+            if remember:
+                self.teacher.add_to_memory(user_goal, cached.to_json())
+            return cached
+        
+        with metrics.span('prompt_build'):
+            prompt = self.build_prompt(user_goal, context)
+        report_progress(on_progress, 'prompt_built')
+        
         try:
-            response = self.teacher.model.generate_content(prompt)
-            plan = response.text
+            report_progress(on_progress, 'model_call_started')
+            with metrics.span('generate'):
+                response = self.generate(prompt, learning_style=learning_style)
+            with metrics.span('parse'):
+                plan = load_plan(user_goal, response.text)
+            report_progress(on_progress, 'first_token')
             
-            # Store in memory
-            self.teacher.add_to_memory(user_goal, plan)
+            # Store the compact JSON form in memory, not the rendered text
+            if remember:
+                self.teacher.add_to_memory(user_goal, plan.to_json())
+            self.store_plan(slot, plan)
             
             return plan
             
         except Exception as e:
-            return f"I encountered an error while planning: {str(e)}"
+            return Plan.failed(user_goal, f"{PLAN_ERROR_PREFIX}: {str(e)}")
+    
+    def stream_structured_plan(self, user_goal, on_progress=None, use_cache=True):
+        """Yield the plan as markdown, one finished section or step at a time
+        
+        The generator's return value is the finished Plan.
+        """
+        
+        learning_style = self.teacher.learning_style
+        with metrics.span('context'):
+            context = self.teacher.get_context()
+        with metrics.span('cache_lookup'):
+            cached, slot = self.lookup_plan(user_goal, context, use_cache, learning_style)
+        if cached is not None:
+            report_progress(on_progress, 'prompt_built')
+            report_progress(on_progress, 'first_token')
+            self.teacher.add_to_memory(user_goal, cached.to_json())
+            yield cached.markdown
+            return cached
+        
+        with metrics.span('prompt_build'):
+            prompt = self.build_prompt(user_goal, context)
+        report_progress(on_progress, 'prompt_built')
+        
+        stream = PlanStream(user_goal)
+        started = time.perf_counter()
+        waited = 0.0
+        first_token = False
+        last = None
+        try:
+            report_progress(on_progress, 'model_call_started')
+            chunks = iter(self.generate_stream(prompt, learning_style))
+            while True:
+                # Only time spent waiting on the model counts, not on whoever consumes the chunks
+                fetch_started = time.perf_counter()
+                chunk = next(chunks, None)
+                waited += time.perf_counter() - fetch_started
+                if chunk is None:
+                    break
+                last = chunk
+                text = chunk.text
+                if text:
+                    if not first_token:
+                        metrics.observe('first_token', time.perf_counter() - started)
+                        report_progress(on_progress, 'first_token')
+                        first_token = True
+                    markdown = stream.feed(text)
+                    if markdown:
+                        yield markdown
+            metrics.observe('generate_stream', waited)
+            # Usage counts are cumulative, so the last chunk has the totals
+            record_usage(last)
+        except Exception as e:
+            metrics.incr('errors', stage='generate_stream')
+            plan = Plan.failed(user_goal, f"{PLAN_ERROR_PREFIX}: {str(e)}")
+            yield plan.markdown
+            return plan
+        
+        # Store the fully assembled plan once the stream is done
+        plan, markdown = stream.close()
+        if markdown:
+            yield markdown
+        self.teacher.add_to_memory(user_goal, plan.to_json())
+        self.store_plan(slot, plan)
+        return plan
 
 
 class EnhancedTeacher(GeminiTeacher):
-    """Extended teacher with learning style detection and personalization"""
+    """Teacher that detects the student's learning style, remembers it and plans for it
+    
+    The style is saved as part of the student profile in the memory
+    store, so it carries over to later sessions. Each style gets its own
+    system instruction, so the model for it is created (and, with
+    GEMINI_CONTEXT_CACHE=1, uploaded) once per process like the plain one.
+    """
     
-    def __init__(self):
-        super().__init__()
+    # Added to the persona for students with a known learning style
+    style_guidance = {
+        'visual': "This student learns best visually: favour diagrams, mind maps, videos and "
+                  "anything they can look at, and suggest a visual for each step.",
+        'auditory': "This student learns best by listening and talking: favour podcasts, lectures, "
+                    "study partners and explaining each step out loud.",
+        'kinesthetic': "This student learns best by doing: make every step hands-on, with exercises "
+                       "and small projects to practice right away."
+    }
+    
+    personalization = {
+        'visual': "👁️ **Visual Learner Tip**: Try creating mind maps or diagrams for each step!",
+        'auditory': "👂 **Auditory Learner Tip**: Explain each step out loud or discuss with a study partner!",
+        'kinesthetic': "🖐️ **Hands-On Tip**: Practice each concept immediately after learning it!"
+    }
+    
+    def __init__(self, memory=None, user_id='default', summarizer=None, classifier=None):
+        super().__init__(memory=memory, user_id=user_id, summarizer=summarizer)
+        self.classifier = classifier or IntentClassifier()
         self.student_profile = {
             'learning_style': None,
             'preferred_pace': None,
             'previous_successes': []
         }
+        self.student_profile.update(self.memory.get_profile(self.user_id) or {})
+    
+    @property
+    def learning_style(self):
+        return self.student_profile['learning_style']
+    
+    def persona(self, learning_style=None):
+        guidance = self.style_guidance.get(learning_style)
+        if guidance is None:
+            return self.teacher_persona
+        return f"{self.teacher_persona}\n        {guidance}\n"
     
     def detect_learning_style(self, user_input):
-        """Simple learning style detection"""
-        styles = {
-            'visual': ['see', 'show', 'visual', 'picture', 'diagram'],
-            'auditory': ['hear', 'listen', 'talk', 'discuss'],
-            'kinesthetic': ['do', 'practice', 'hands-on', 'try']
-        }
-        
-        for style, keywords in styles.items():
-            if any(keyword in user_input.lower() for keyword in keywords):
-                self.student_profile['learning_style'] = style
-                return style
-        return None
+        """Learning style the student's wording hints at, or None"""
+        style = self.classifier.classify(user_input).learning_style
+        self.update_learning_style(style)
+        return style
+    
+    def update_learning_style(self, style):
+        """Remember a newly detected learning style; None leaves the profile as it is"""
+        if style is not None and style != self.student_profile['learning_style']:
+            self.student_profile['learning_style'] = style
+            self.memory.set_profile(self.user_id, self.student_profile)
     
     def personalize_response(self, base_plan, learning_style):
-        """Add personalization based on learning style"""
-        personalization = {
-            'visual': "\n👁️ **Visual Learner Tip**: Try creating mind maps or diagrams for each step!",
-            'auditory': "\n👂 **Auditory Learner Tip**: Explain each step out loud or discuss with a study partner!",
-            'kinesthetic': "\n🖐️ **Hands-On Tip**: Practice each concept immediately after learning it!"
-        }
-        
-        if learning_style in personalization:
-            return base_plan + personalization[learning_style]
+        """Add the learning style's tip to a Plan's tips (or to the end of plan text)"""
+        tip = self.personalization.get(learning_style)
+        if tip is None:
+            return base_plan
+        if isinstance(base_plan, str):
+            return base_plan + "\n" + tip
+        if not base_plan.error:
+            base_plan.add_tip(tip)
         return base_plan
 
 
 def main():
     """Main entry point for the planning assistant"""
-    import time
     from web_research import PlannerAgent
     
     # Initialize our planner agent
@@ -178,7 +696,6 @@ def main():
         print("\n" + "="*50)
         plan = professor.process_goal(goal)
         print(f"\n🧠 Professor's Plan:\n{plan}")
-        time.sleep(2)  # Small delay to simulate thinking
     
     # Show progress report
     print("\n" + "="*50)
@@ -0,0 +1,502 @@
+"""
+Conversation memory backends for GeminiTeacher
+
+Every backend keeps the last `retention` exchanges per user and hands them
+back as dicts with 'id', 'user', 'assistant', 'timestamp' (the exchange's
+position in that user's history) and 'created_at' (seconds since the epoch),
+plus 'summary' once a compact summary of the plan has been saved.
+Each user's student profile (a small JSON-serializable dict) is kept
+alongside their history.
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+
+class MemoryStore:
+    """Interface shared by the memory backends"""
+
+    # Whether evict() really frees the user's resident_bytes()
+    evicts = False
+
+    def __init__(self, retention=20):
+        self.retention = retention
+
+    def append(self, user_id, user_input, assistant_response):
+        """Store one exchange and return the stored entry"""
+        raise NotImplementedError
+
+    def recent(self, user_id, limit=None):
+        """The user's last `limit` exchanges (default: all retained), oldest first"""
+        raise NotImplementedError
+
+    def set_summary(self, user_id, entry_id, summary):
+        """Save a JSON-serializable summary next to an exchange"""
+        raise NotImplementedError
+
+    def get_profile(self, user_id):
+        """The user's saved student profile, or None"""
+        raise NotImplementedError
+
+    def set_profile(self, user_id, profile):
+        """Replace the user's student profile"""
+        raise NotImplementedError
+
+    def resident_bytes(self, user_id):
+        """Roughly how much process memory the user's history takes"""
+        return 0
+
+    def evict(self, user_id):
+        """Move the user's history out of process memory until restore()"""
+
+    def restore(self, user_id):
+        """Bring an evicted user's history back into process memory"""
+
+    def find(self, user_id, goal=None, since=None, until=None, limit=None):
+        """Retained exchanges whose goal contains `goal` and that fall in [since, until)"""
+        entries = self.recent(user_id)
+        if goal is not None:
+            entries = [e for e in entries if goal.lower() in e['user'].lower()]
+        if since is not None:
+            entries = [e for e in entries if e['created_at'] >= since]
+        if until is not None:
+            entries = [e for e in entries if e['created_at'] < until]
+        return entries[-limit:] if limit else entries
+
+
+class _Record:
+    """One retained exchange, stored more compactly than the dict handed out for it"""
+
+    __slots__ = ('position', 'user', 'assistant', 'created_at', 'summary')
+
+    # The record itself, its number fields and its slot in the deque
+    OVERHEAD = 160
+
+    def __init__(self, position, user, assistant, created_at, summary=None):
+        self.position = position
+        self.user = user
+        self.assistant = assistant
+        self.created_at = created_at
+        self.summary = summary
+
+    @classmethod
+    def from_entry(cls, entry):
+        return cls(entry['timestamp'], entry['user'], entry['assistant'], entry['created_at'],
+                   entry.get('summary'))
+
+    def entry(self, user_id):
+        entry = {
+            'id': f"{user_id}:{self.position}",
+            'user': self.user,
+            'assistant': self.assistant,
+            'timestamp': self.position,
+            'created_at': self.created_at
+        }
+        if self.summary is not None:
+            entry['summary'] = self.summary
+        return entry
+
+    def nbytes(self):
+        size = self.OVERHEAD + sys.getsizeof(self.user) + sys.getsizeof(self.assistant)
+        if self.summary is not None:
+            # A goal plus a title and timeline per step, each in its own dict
+            size += 300 + 300 * len(self.summary.get('steps', ()))
+        return size
+
+
+class InMemoryStore(MemoryStore):
+    """Bounded per-user deques in process memory; the default
+
+    evict() moves a user's history and profile to a SQLite file in a
+    temporary directory, created on first use. Calls for an evicted user,
+    such as a late summary, are served from that file without loading
+    anything back; only restore() does that. The file only lives as long
+    as the process, so this backend still forgets everything on restart.
+    """
+
+    evicts = True
+
+    def __init__(self, retention=20):
+        super().__init__(retention)
+        self._users = {}
+        self._counts = {}
+        self._profiles = {}
+        self._sizes = {}
+        self._evicted = set()
+        self._lock = threading.Lock()
+        self._spill = None
+        self._spill_dir = None
+
+    def append(self, user_id, user_input, assistant_response):
+        with self._lock:
+            if user_id in self._evicted:
+                return self._spill.append(user_id, user_input, assistant_response)
+            return self._append(user_id, user_input, assistant_response)
+
+    def recent(self, user_id, limit=None):
+        with self._lock:
+            if user_id in self._evicted:
+                return self._spill.recent(user_id, limit)
+            history = list(self._history(user_id))
+        if limit:
+            history = history[-limit:]
+        return [record.entry(user_id) for record in history]
+
+    def set_summary(self, user_id, entry_id, summary):
+        position = int(entry_id.rsplit(':', 1)[1])
+        with self._lock:
+            if user_id in self._evicted:
+                return self._spill.set_summary(user_id, entry_id, summary)
+            return self._set_summary(user_id, position, summary)
+
+    def get_profile(self, user_id):
+        with self._lock:
+            if user_id in self._evicted:
+                return self._spill.get_profile(user_id)
+            profile = self._profiles.get(user_id)
+        return dict(profile) if profile is not None else None
+
+    def set_profile(self, user_id, profile):
+        with self._lock:
+            if user_id in self._evicted:
+                self._spill.set_profile(user_id, profile)
+                return
+            self._history(user_id)
+            self._profiles[user_id] = dict(profile)
+
+    def resident_bytes(self, user_id):
+        with self._lock:
+            return self._sizes.get(user_id, 0)
+
+    def evict(self, user_id):
+        with self._lock:
+            history = self._users.pop(user_id, None)
+            if history is None:
+                return
+            if self._spill is None:
+                self._spill_dir = tempfile.TemporaryDirectory(prefix='planner-memory-')
+                self._spill = SQLiteMemoryStore(os.path.join(self._spill_dir.name, 'evicted.sqlite3'),
+                                                self.retention)
+            self._spill.replace_history(
+                user_id, [record.entry(user_id) for record in history], self._profiles.pop(user_id, None)
+            )
+            del self._sizes[user_id]
+            self._counts.pop(user_id, None)
+            self._evicted.add(user_id)
+
+    def restore(self, user_id):
+        with self._lock:
+            if user_id not in self._evicted:
+                return
+            self._evicted.remove(user_id)
+            entries, profile = self._spill.take_history(user_id)
+            history = self._history(user_id)
+            for entry in entries:
+                record = _Record.from_entry(entry)
+                history.append(record)
+                self._sizes[user_id] += record.nbytes()
+            if entries:
+                self._counts[user_id] = entries[-1]['timestamp'] + 1
+            if profile is not None:
+                self._profiles[user_id] = profile
+
+    def _append(self, user_id, user_input, assistant_response):
+        """Add an exchange for a user who is in memory; hold the lock"""
+        history = self._history(user_id)
+        position = self._counts.get(user_id, 0)
+        self._counts[user_id] = position + 1
+        record = _Record(position, user_input, assistant_response, time.time())
+        if len(history) == history.maxlen:
+            self._sizes[user_id] -= history[0].nbytes()
+        history.append(record)
+        self._sizes[user_id] += record.nbytes()
+        return record.entry(user_id)
+
+    def _set_summary(self, user_id, position, summary):
+        """Attach a summary for a user who is in memory; hold the lock"""
+        for record in reversed(self._history(user_id)):
+            if record.position == position:
+                self._sizes[user_id] -= record.nbytes()
+                record.summary = summary
+                self._sizes[user_id] += record.nbytes()
+                return True
+        return False
+
+    def _history(self, user_id):
+        """The user's deque, created empty for a new user; hold the lock"""
+        history = self._users.get(user_id)
+        if history is None:
+            history = self._users[user_id] = deque(maxlen=self.retention)
+            self._sizes[user_id] = 0
+        return history
+
+
+class SQLiteMemoryStore(MemoryStore):
+    """Memory in a SQLite file, indexed by user and position, and by time
+
+    find() matches goals with LIKE '%goal%', which no index can serve, but
+    the primary key already narrows it to one user's retained rows.
+    """
+
+    def __init__(self, path, retention=20):
+        super().__init__(retention)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS memory (
+                user_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                user TEXT NOT NULL,
+                assistant TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                summary TEXT,
+                PRIMARY KEY (user_id, position)
+            );
+            CREATE INDEX IF NOT EXISTS memory_time ON memory (user_id, created_at);
+            DROP INDEX IF EXISTS memory_goal;
+            CREATE TABLE IF NOT EXISTS profiles (
+                user_id TEXT PRIMARY KEY,
+                profile TEXT NOT NULL
+            );
+        """)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(memory)")]
+        if 'summary' not in columns:
+            # Stores written before plans were summarized
+            self._db.execute("ALTER TABLE memory ADD COLUMN summary TEXT")
+        self._db.commit()
+
+    def append(self, user_id, user_input, assistant_response):
+        now = time.time()
+        with self._lock:
+            last = self._db.execute(
+                "SELECT MAX(position) FROM memory WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+            position = 0 if last is None else last + 1
+            self._db.execute(
+                "INSERT INTO memory (user_id, position, user, assistant, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (user_id, position, user_input, assistant_response, now)
+            )
+            # Only the oldest row can have fallen out of the window, so this stays O(1)
+            self._db.execute(
+                "DELETE FROM memory WHERE user_id = ? AND position <= ?",
+                (user_id, position - self.retention)
+            )
+            self._db.commit()
+        return self._entry(user_id, position, user_input, assistant_response, now)
+
+    def recent(self, user_id, limit=None):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT position, user, assistant, created_at, summary FROM memory "
+                "WHERE user_id = ? ORDER BY position DESC LIMIT ?",
+                (user_id, limit or self.retention)
+            ).fetchall()
+        return [self._entry(user_id, *row) for row in reversed(rows)]
+
+    def find(self, user_id, goal=None, since=None, until=None, limit=None):
+        query = "SELECT position, user, assistant, created_at, summary FROM memory WHERE user_id = ?"
+        params = [user_id]
+        if goal is not None:
+            query += " AND user LIKE ?"
+            params.append(f"%{goal}%")
+        if since is not None:
+            query += " AND created_at >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND created_at < ?"
+            params.append(until)
+        query += " ORDER BY position DESC LIMIT ?"
+        params.append(limit or self.retention)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [self._entry(user_id, *row) for row in reversed(rows)]
+
+    def set_summary(self, user_id, entry_id, summary):
+        position = int(entry_id.rsplit(':', 1)[1])
+        with self._lock:
+            updated = self._db.execute(
+                "UPDATE memory SET summary = ? WHERE user_id = ? AND position = ?",
+                (json.dumps(summary), user_id, position)
+            ).rowcount
+            self._db.commit()
+        return bool(updated)
+
+    def get_profile(self, user_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT profile FROM profiles WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_profile(self, user_id, profile):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO profiles (user_id, profile) VALUES (?, ?)",
+                (user_id, json.dumps(profile))
+            )
+            self._db.commit()
+
+    def replace_history(self, user_id, entries, profile=None):
+        """Store exactly these entries (and profile) for the user, keeping their positions"""
+        with self._lock:
+            self._db.execute("DELETE FROM memory WHERE user_id = ?", (user_id,))
+            self._db.executemany(
+                "INSERT INTO memory (user_id, position, user, assistant, created_at, summary) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(user_id, e['timestamp'], e['user'], e['assistant'], e['created_at'],
+                  json.dumps(e['summary']) if 'summary' in e else None) for e in entries]
+            )
+            if profile is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO profiles (user_id, profile) VALUES (?, ?)",
+                    (user_id, json.dumps(profile))
+                )
+            self._db.commit()
+
+    def take_history(self, user_id):
+        """Remove and return the user's (entries, profile), e.g. to load them into memory"""
+        entries = self.recent(user_id)
+        profile = self.get_profile(user_id)
+        with self._lock:
+            self._db.execute("DELETE FROM memory WHERE user_id = ?", (user_id,))
+            self._db.execute("DELETE FROM profiles WHERE user_id = ?", (user_id,))
+            self._db.commit()
+        return entries, profile
+
+    @staticmethod
+    def _entry(user_id, position, user_input, assistant_response, created_at, summary=None):
+        entry = {
+            'id': f"{user_id}:{position}",
+            'user': user_input,
+            'assistant': assistant_response,
+            'timestamp': position,
+            'created_at': created_at
+        }
+        if summary:
+            entry['summary'] = json.loads(summary)
+        return entry
+
+
+class AppendLogMemoryStore(InMemoryStore):
+    """In-memory deques made durable by an append-only JSON lines log
+
+    The log is replayed once at startup and rewritten with only the
+    retained entries whenever it grows to `compact_factor` times that size.
+    Summaries are logged as separate {'id', 'summary'} records and
+    profiles as {'profile'} records, the last one for a user winning.
+    Every user stays in memory, since compaction rewrites the log from it,
+    so evict() frees nothing here.
+    """
+
+    evicts = False
+
+    def __init__(self, path, retention=20, compact_factor=4):
+        super().__init__(retention)
+        self.path = path
+        self.compact_factor = compact_factor
+        self._lines = 0
+        # Entries retained over all users, kept up to date so append stays O(1)
+        self._retained = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        user_id, entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-write
+                        continue
+                    self._restore(user_id, entry)
+                    self._lines += 1
+        self._retained = sum(len(history) for history in self._users.values())
+        self._log = open(path, 'a', encoding='utf-8')
+
+    # Each change is made and logged under one lock, so the log's order is
+    # the order the changes happened in and replaying it gives the same ids
+
+    def append(self, user_id, user_input, assistant_response):
+        with self._lock:
+            if len(self._users.get(user_id, ())) < self.retention:
+                self._retained += 1
+            entry = self._append(user_id, user_input, assistant_response)
+            self._write(user_id, entry)
+            if self._lines > self.compact_factor * max(self._retained, self.retention):
+                self._compact()
+        return entry
+
+    def set_summary(self, user_id, entry_id, summary):
+        position = int(entry_id.rsplit(':', 1)[1])
+        with self._lock:
+            if not self._set_summary(user_id, position, summary):
+                return False
+            self._write(user_id, {'id': entry_id, 'summary': summary})
+        return True
+
+    def set_profile(self, user_id, profile):
+        with self._lock:
+            self._history(user_id)
+            self._profiles[user_id] = dict(profile)
+            self._write(user_id, {'profile': profile})
+
+    def evict(self, user_id):
+        pass
+
+    def _write(self, user_id, record):
+        self._log.write(json.dumps([user_id, record], ensure_ascii=False) + '\n')
+        self._log.flush()
+        self._lines += 1
+
+    def _restore(self, user_id, entry):
+        if 'profile' in entry:
+            self._profiles[user_id] = entry['profile']
+            return
+        if 'user' not in entry:
+            # A summary for an entry we have already replayed
+            position = int(entry['id'].rsplit(':', 1)[1])
+            for record in self._users.get(user_id, ()):
+                if record.position == position:
+                    record.summary = entry['summary']
+            return
+        history = self._history(user_id)
+        if len(history) == history.maxlen:
+            self._sizes[user_id] -= history[0].nbytes()
+        record = _Record.from_entry(entry)
+        history.append(record)
+        self._sizes[user_id] += record.nbytes()
+        self._counts[user_id] = record.position + 1
+
+    def _compact(self):
+        """Rewrite the log with only the retained entries"""
+        self._log.close()
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            for user_id, history in self._users.items():
+                for record in history:
+                    f.write(json.dumps([user_id, record.entry(user_id)], ensure_ascii=False) + '\n')
+            for user_id, profile in self._profiles.items():
+                f.write(json.dumps([user_id, {'profile': profile}], ensure_ascii=False) + '\n')
+        os.replace(temporary, self.path)
+        self._lines = self._retained + len(self._profiles)
+        self._log = open(self.path, 'a', encoding='utf-8')
+
+
+def open_memory_store():
+    """Create the backend named by MEMORY_BACKEND (memory, sqlite or log)"""
+    backend = os.getenv('MEMORY_BACKEND', 'memory')
+    if backend == 'sqlite':
+        return SQLiteMemoryStore(os.getenv('MEMORY_PATH', os.path.join('.cache', 'memory.sqlite3')))
+    if backend == 'log':
+        return AppendLogMemoryStore(os.getenv('MEMORY_PATH', os.path.join('.cache', 'memory.jsonl')))
+    return InMemoryStore()
@@ -0,0 +1,183 @@
+"""
+In-process instrumentation for the planning pipeline
+
+    from metrics import metrics
+
+    with metrics.span('generate'):
+        ...
+    metrics.incr('plan_lookups', result='hit')
+
+Stage timings keep a sliding window of recent samples for p50/p95/p99.
+Everything can be read as a dict (snapshot), as Prometheus text (served on
+METRICS_PORT) or appended to a JSON lines log (METRICS_LOG).
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Timing:
+    """Recent samples of one stage's duration plus lifetime totals"""
+
+    __slots__ = ('samples', 'next', 'count', 'total')
+
+    def __init__(self, window):
+        self.samples = [0.0] * window
+        self.next = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples[self.next] = seconds
+        self.next = (self.next + 1) % len(self.samples)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self):
+        recent = sorted(self.samples[:min(self.count, len(self.samples))])
+        if not recent:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: recent[min(len(recent) - 1, int(q * len(recent)))] for q in QUANTILES}
+
+
+class Metrics:
+    """Thread-safe registry of stage timings, counters and collected gauges"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._counters = {}
+        self._collectors = {}
+
+    @contextmanager
+    def span(self, stage):
+        """Time the enclosed block as one sample of `stage`; exceptions count as errors"""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.incr('errors', stage=stage)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            timing = self._timings.get(stage)
+            if timing is None:
+                timing = self._timings[stage] = _Timing(self.window)
+            timing.add(seconds)
+
+    def incr(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register(self, name, collect):
+        """Add a callable returning a dict of numbers, read on every snapshot"""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """Everything measured so far as a JSON-serializable dict"""
+        with self._lock:
+            stages = {
+                stage: {
+                    'count': timing.count,
+                    'total_seconds': timing.total,
+                    **{f"p{int(q * 100)}": value for q, value in timing.quantiles().items()}
+                }
+                for stage, timing in self._timings.items()
+            }
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            collectors = list(self._collectors.items())
+
+        collected = {}
+        for name, collect in collectors:
+            try:
+                collected[name] = collect()
+            except Exception as e:
+                collected[name] = {'error': str(e)}
+        return {'time': time.time(), 'stages': stages, 'counters': counters, 'collected': collected}
+
+    def prometheus(self):
+        """The snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = ['# TYPE planner_stage_seconds summary']
+        for stage, stats in sorted(snapshot['stages'].items()):
+            for q in QUANTILES:
+                lines.append(
+                    f'planner_stage_seconds{{stage="{stage}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]:.6f}'
+                )
+            lines.append(f'planner_stage_seconds_sum{{stage="{stage}"}} {stats["total_seconds"]:.6f}')
+            lines.append(f'planner_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+
+        typed = set()
+        for counter in snapshot['counters']:
+            name = f"planner_{counter['name']}_total"
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            labels = ','.join(f'{k}="{v}"' for k, v in counter['labels'].items())
+            lines.append(f"{name}{{{labels}}} {counter['value']}" if labels else f"{name} {counter['value']}")
+
+        for source, values in sorted(snapshot['collected'].items()):
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE planner_{source}_{key} gauge")
+                    lines.append(f"planner_{source}_{key} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+# The process-wide registry every module records into
+metrics = Metrics()
+
+
+def serve_prometheus(port, registry=metrics, host='127.0.0.1'):
+    """Serve registry.prometheus() at http://host:port/metrics from a daemon thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def start_json_log(path, interval=60.0, registry=metrics):
+    """Append a snapshot to a JSON lines file every `interval` seconds"""
+
+    def run():
+        while True:
+            time.sleep(interval)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(registry.snapshot()) + '\n')
+
+    thread = threading.Thread(target=run, name='metrics-log', daemon=True)
+    thread.start()
+    return thread
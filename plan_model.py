@@ -0,0 +1,564 @@
+"""
+Typed plan objects parsed from Gemini's structured JSON output
+
+Plans travel through the cache, memory and UI as small Plan/Step/Resource
+objects (or their compact dict/JSON form); markdown is only rendered when a
+plan is actually shown, and then only once.
+"""
+import json
+import re
+
+from goal_index import STOPWORDS
+
+# JSON schema Gemini fills in for every plan
+PLAN_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'analysis': {
+            'type': 'object',
+            'properties': {
+                'summary': {'type': 'string'},
+                'importance': {'type': 'string'},
+                'challenges': {'type': 'array', 'items': {'type': 'string'}}
+            },
+            'required': ['summary', 'importance', 'challenges']
+        },
+        'steps': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'title': {'type': 'string'},
+                    'reasoning': {'type': 'string'},
+                    'time': {'type': 'string'},
+                    'resources': {'type': 'array', 'items': {'type': 'string'}},
+                    'success_criteria': {'type': 'string'}
+                },
+                'required': ['title', 'reasoning', 'time', 'resources', 'success_criteria']
+            }
+        },
+        'research': {'type': 'string'},
+        'notes': {
+            'type': 'object',
+            'properties': {
+                'encouragement': {'type': 'string'},
+                'tips': {'type': 'array', 'items': {'type': 'string'}},
+                'focus': {'type': 'string'}
+            },
+            'required': ['encouragement', 'tips', 'focus']
+        }
+    },
+    'required': ['analysis', 'steps', 'notes']
+}
+
+# JSON schema for revisions: only the steps that change, numbered as in the
+# previous plan. 'add' inserts after the given step (0 puts it first)
+REVISION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'goal': {'type': 'string'},
+        'summary': {'type': 'string'},
+        'changes': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'action': {'type': 'string', 'enum': ['replace', 'add', 'remove']},
+                    'step': {'type': 'integer'},
+                    'title': {'type': 'string'},
+                    'reasoning': {'type': 'string'},
+                    'time': {'type': 'string'},
+                    'resources': {'type': 'array', 'items': {'type': 'string'}},
+                    'success_criteria': {'type': 'string'}
+                },
+                'required': ['action', 'step']
+            }
+        }
+    },
+    'required': ['changes']
+}
+
+STEP_FIELDS = ('title', 'reasoning', 'time', 'resources', 'success_criteria')
+
+# Top-level sections in the order they are rendered
+SECTIONS = ('analysis', 'steps', 'research', 'notes')
+
+# Step titles and timelines in plans that were written as free-form markdown
+STEP = re.compile(r'^\s*(?:[-*]\s*)?(?:\*\*)?(?:Step\s*)?(\d+)[.):]\s*(?:\*\*)?\s*(.+)$', re.IGNORECASE)
+DURATION = re.compile(
+    r'\b(\d+(?:\s*(?:-|–|to)\s*\d+)?\s*(?:hours?|days?|weeks?|months?|years?))\b', re.IGNORECASE
+)
+
+
+class Resource:
+    """Something to learn from: a course, book, doc or anything else with a title"""
+
+    __slots__ = ('title', 'link', 'kind')
+
+    def __init__(self, title, link=None, kind=None):
+        self.title = title
+        self.link = link
+        self.kind = kind
+
+    def __eq__(self, other):
+        return isinstance(other, Resource) and self.to_dict() == other.to_dict()
+
+    def to_dict(self):
+        data = {'title': self.title}
+        if self.link:
+            data['link'] = self.link
+        if self.kind:
+            data['kind'] = self.kind
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, str):
+            return cls(data)
+        return cls(data['title'], data.get('link'), data.get('kind'))
+
+
+class Step:
+    """One step of a plan"""
+
+    __slots__ = ('title', 'reasoning', 'time', 'resources', 'success_criteria')
+
+    def __init__(self, title, reasoning='', time=None, resources=(), success_criteria=''):
+        self.title = title
+        self.reasoning = reasoning
+        self.time = time
+        self.resources = tuple(resources)
+        self.success_criteria = success_criteria
+
+    def __eq__(self, other):
+        return isinstance(other, Step) and self.to_dict() == other.to_dict()
+
+    def to_dict(self):
+        data = {'title': self.title}
+        if self.reasoning:
+            data['reasoning'] = self.reasoning
+        if self.time:
+            data['time'] = self.time
+        if self.resources:
+            data['resources'] = [resource.to_dict() for resource in self.resources]
+        if self.success_criteria:
+            data['success_criteria'] = self.success_criteria
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['title'],
+            data.get('reasoning', ''),
+            data.get('time'),
+            [Resource.from_dict(r) for r in data.get('resources', ())],
+            data.get('success_criteria', '')
+        )
+
+    def markdown(self, number):
+        text = f"**Step {number}: {self.title}**"
+        if self.time:
+            text += f" — ⏱️ {self.time}"
+        text += "\n\n"
+        if self.reasoning:
+            text += f"{self.reasoning}\n\n"
+        if self.resources:
+            text += f"- 📚 Resources: {', '.join(r.title for r in self.resources)}\n"
+        if self.success_criteria:
+            text += f"- ✅ Success looks like: {self.success_criteria}\n"
+        return text + "\n"
+
+
+class Plan:
+    """A plan for one goal
+
+    Plans written before structured output (or when the model ignores the
+    schema) keep their markdown as-is and get their steps from it.
+    """
+
+    __slots__ = ('goal', 'summary', 'importance', 'challenges', 'steps', 'research',
+                 'encouragement', 'tips', 'focus', 'resources', 'note', 'error',
+                 'source_markdown', '_markdown')
+
+    def __init__(self, goal, steps=(), summary='', importance='', challenges=(), research='',
+                 encouragement='', tips=(), focus='', resources=(), note=None, error=None,
+                 source_markdown=None):
+        self.goal = goal
+        self.steps = list(steps)
+        self.summary = summary
+        self.importance = importance
+        self.challenges = tuple(challenges)
+        self.research = research
+        self.encouragement = encouragement
+        self.tips = tuple(tips)
+        self.focus = focus
+        # Resources found by research after the plan was written
+        self.resources = list(resources)
+        # A remark shown above the plan, e.g. that it was written for a similar goal
+        self.note = note
+        self.error = error
+        self.source_markdown = source_markdown
+        self._markdown = None
+
+    def __str__(self):
+        return self.markdown
+
+    # Building from model output and the stored forms
+
+    def set_section(self, name, value):
+        """Fill in one top-level section of the model's JSON output"""
+        if name == 'analysis':
+            self.summary = value.get('summary', '')
+            self.importance = value.get('importance', '')
+            self.challenges = tuple(value.get('challenges', ()))
+        elif name == 'steps':
+            self.steps = [Step.from_dict(step) for step in value]
+        elif name == 'research':
+            self.research = value
+        elif name == 'notes':
+            self.encouragement = value.get('encouragement', '')
+            self.tips = tuple(value.get('tips', ()))
+            self.focus = value.get('focus', '')
+        self._markdown = None
+
+    @classmethod
+    def from_dict(cls, data, goal=None):
+        """Build a plan from model output or from to_dict()"""
+        plan = cls(data.get('goal', goal), note=data.get('note'), error=data.get('error'))
+        if 'markdown' in data:
+            plan.source_markdown = data['markdown']
+            plan.steps = steps_from_markdown(data['markdown'])
+        for name in SECTIONS:
+            if name in data:
+                plan.set_section(name, data[name])
+        plan.resources = [Resource.from_dict(r) for r in data.get('found_resources', ())]
+        return plan
+
+    @classmethod
+    def from_markdown(cls, goal, text):
+        return cls(goal, steps=steps_from_markdown(text), source_markdown=text)
+
+    @classmethod
+    def failed(cls, goal, message):
+        return cls(goal, error=message)
+
+    def to_dict(self):
+        """Compact JSON-serializable form; empty fields are left out"""
+        data = {'goal': self.goal}
+        if self.error:
+            data['error'] = self.error
+        if self.note:
+            data['note'] = self.note
+        if self.source_markdown is not None:
+            data['markdown'] = self.source_markdown
+        else:
+            analysis = {'summary': self.summary, 'importance': self.importance,
+                        'challenges': list(self.challenges)}
+            notes = {'encouragement': self.encouragement, 'tips': list(self.tips),
+                     'focus': self.focus}
+            if any(analysis.values()):
+                data['analysis'] = analysis
+            if self.steps:
+                data['steps'] = [step.to_dict() for step in self.steps]
+            if self.research:
+                data['research'] = self.research
+            if any(notes.values()):
+                data['notes'] = notes
+        if self.resources:
+            data['found_resources'] = [r.to_dict() for r in self.resources]
+        return data
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':'))
+
+    def copy(self):
+        return Plan.from_dict(self.to_dict())
+
+    # Views
+
+    def add_resources(self, results):
+        """Attach research results ({'title', 'link'} dicts), skipping known links"""
+        known = {r.link for r in self.resources}
+        for result in results or ():
+            if result.get('link') not in known:
+                self.resources.append(Resource(result['title'], result.get('link'), result.get('kind')))
+                known.add(result.get('link'))
+        self._markdown = None
+
+    def add_tip(self, tip):
+        """Append a tip to the teacher's notes, unless it is already there"""
+        if tip not in self.tips:
+            self.tips += (tip,)
+            self._markdown = None
+
+    def revised(self, patch):
+        """A new plan with a REVISION_SCHEMA patch applied; this one is left as is"""
+        if self.source_markdown is not None:
+            # Only its step titles were scraped, so patching would drop everything else
+            raise ValueError("A markdown plan can't be patched; write it again instead")
+        plan = self.copy()
+        plan.note = None
+        plan.goal = patch.get('goal') or self.goal
+        if patch.get('summary'):
+            plan.summary = patch['summary']
+
+        replaced, removed, added = {}, set(), {}
+        for change in patch.get('changes', ()):
+            number = change['step']
+            fields = {name: change[name] for name in STEP_FIELDS if name in change}
+            if change['action'] == 'remove':
+                removed.add(number)
+            elif change['action'] == 'add' and 'title' in fields:
+                added.setdefault(number, []).append(Step.from_dict(fields))
+            elif change['action'] == 'replace' and 1 <= number <= len(plan.steps):
+                # Fields the model left out keep their previous values
+                step = plan.steps[number - 1].to_dict()
+                step.update(fields)
+                replaced[number] = Step.from_dict(step)
+
+        steps = added.get(0, [])
+        for number, step in enumerate(plan.steps, 1):
+            if number not in removed:
+                steps.append(replaced.get(number, step))
+            steps.extend(added.get(number, ()))
+        plan.steps = steps
+        plan._markdown = None
+        return plan
+
+    def outline(self):
+        """Numbered step titles and timelines, one per line"""
+        return '\n'.join(
+            f"{n}. {step.title}" + (f" ({step.time})" if step.time else '')
+            for n, step in enumerate(self.steps, 1)
+        )
+
+    def summary_dict(self):
+        """{'goal', 'steps': [{'title', 'time'}]}: the form kept in memory for prompts"""
+        return {'goal': self.goal,
+                'steps': [{'title': step.title, 'time': step.time} for step in self.steps]}
+
+    @property
+    def markdown(self):
+        """The plan as markdown, rendered on first use"""
+        if self._markdown is None:
+            parts = [f"📌 *{self.note}*\n\n" if self.note else '']
+            if self.error:
+                parts.append(self.error)
+            elif self.source_markdown is not None:
+                parts.append(self.source_markdown)
+            else:
+                parts.extend(self.section_markdown(name) for name in SECTIONS)
+            parts.append(self.resources_markdown())
+            self._markdown = ''.join(parts)
+        return self._markdown
+
+    def section_markdown(self, name):
+        if name == 'analysis':
+            if not self.summary:
+                return ''
+            text = f"🎯 **GOAL ANALYSIS**\n\n{self.summary}\n\n"
+            if self.importance:
+                text += f"**Why it matters:** {self.importance}\n\n"
+            if self.challenges:
+                text += "**Potential challenges:**\n" + ''.join(f"- {c}\n" for c in self.challenges) + "\n"
+            return text
+        if name == 'steps':
+            if not self.steps:
+                return ''
+            return STEPS_HEADING + ''.join(step.markdown(i) for i, step in enumerate(self.steps, 1))
+        if name == 'research':
+            return f"🔍 **ADDITIONAL RESEARCH**\n\n{self.research}\n\n" if self.research else ''
+        if name == 'notes':
+            if not (self.encouragement or self.tips or self.focus):
+                return ''
+            text = "💡 **TEACHER'S NOTES**\n\n"
+            if self.encouragement:
+                text += f"{self.encouragement}\n\n"
+            if self.tips:
+                text += ''.join(f"- {tip}\n" for tip in self.tips) + "\n"
+            if self.focus:
+                text += f"**Focus on:** {self.focus}\n"
+            return text
+        return ''
+
+    def resources_markdown(self):
+        if not self.resources:
+            return ''
+        return "\n\n🌐 **Additional Resources I Found:**\n" + ''.join(
+            f"• {r.title}\n" for r in self.resources
+        )
+
+
+STEPS_HEADING = "📝 **STRUCTURED PLAN**\n\n"
+
+
+def steps_from_markdown(text, max_steps=12):
+    """Step titles and timelines found in a free-form markdown plan"""
+    steps = []
+    for line in text.splitlines():
+        match = STEP.match(line)
+        if match and len(steps) < max_steps:
+            title = match.group(2).replace('**', '').strip().rstrip(':')
+            duration = DURATION.search(title)
+            steps.append(Step(title[:100], time=duration.group(1) if duration else None))
+        elif steps and steps[-1].time is None:
+            # The estimate usually sits a few lines under the step's title
+            duration = DURATION.search(line)
+            if duration:
+                steps[-1].time = duration.group(1)
+    return steps
+
+
+def affected_steps(plan, change_request):
+    """Numbers of the steps a change request is about: named by number or sharing words"""
+    text = change_request.lower()
+    numbers = {int(n) for n in re.findall(r'\bstep\s*#?(\d+)', text)}
+    words = {w for w in re.findall(r'[a-z0-9+#]+', text) if w not in STOPWORDS and len(w) > 2}
+    for number, step in enumerate(plan.steps, 1):
+        if words & set(re.findall(r'[a-z0-9+#]+', step.title.lower())):
+            numbers.add(number)
+    return sorted(n for n in numbers if 1 <= n <= len(plan.steps))
+
+
+def is_structured(text):
+    return text.lstrip().startswith('{')
+
+
+def load_plan(goal, value):
+    """A Plan from model output text, a stored JSON string or a to_dict() dict"""
+    if isinstance(value, Plan):
+        return value
+    if isinstance(value, dict):
+        return Plan.from_dict(value, goal)
+    if is_structured(value):
+        try:
+            return Plan.from_dict(json.loads(value), goal)
+        except (ValueError, AttributeError, KeyError, TypeError):
+            pass
+    return Plan.from_markdown(goal, value)
+
+
+class PlanStream:
+    """Parse a plan's JSON while it streams in and render each part once complete
+
+    feed() returns whatever markdown became available, always in the same
+    order Plan.markdown uses, so the streamed text equals the final render.
+    Steps are rendered one at a time. Output that isn't JSON is passed
+    through untouched and kept as a markdown plan.
+    """
+
+    def __init__(self, goal):
+        self.plan = Plan(goal)
+        self._text = []
+        self._buffer = ''
+        self._pos = 0
+        self._state = 'start'
+        self._key = None
+        self._done = set()
+        self._steps = []
+        self._section = 0
+        self._rendered_steps = 0
+        self._passthrough = False
+
+    def feed(self, text):
+        self._text.append(text)
+        if self._passthrough:
+            return text
+        self._buffer += text
+        if self._state == 'start':
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return ''
+            if not stripped.startswith('{'):
+                self._passthrough = True
+                return self._buffer
+            self._pos = self._buffer.index('{') + 1
+            self._state = 'key'
+        self._parse()
+        return self._render()
+
+    def close(self):
+        """Flush what is left; returns (finished Plan, remaining markdown)"""
+        text = ''.join(self._text)
+        if self._passthrough:
+            return Plan.from_markdown(self.plan.goal, text), ''
+        plan = load_plan(self.plan.goal, text)
+        if plan.source_markdown is not None:
+            # Not valid JSON after all; show it as text unless part of it already was
+            return plan, '' if self._section or self._rendered_steps else text
+        self.plan = plan
+        return plan, self._render(final=True)
+
+    def _parse(self):
+        decoder = json.JSONDecoder()
+        buffer = self._buffer
+        while True:
+            pos = self._skip(buffer, self._pos)
+            if pos >= len(buffer):
+                return
+            try:
+                if self._state == 'key':
+                    if buffer[pos] == '}':
+                        self._state = 'end'
+                        return
+                    key, end = decoder.raw_decode(buffer, pos)
+                    end = self._skip(buffer, end)
+                    if end >= len(buffer) or buffer[end] != ':':
+                        return
+                    self._key = key
+                    self._pos = end + 1
+                    self._state = 'value'
+                elif self._state == 'value':
+                    if self._key == 'steps' and buffer[pos] == '[':
+                        self._pos = pos + 1
+                        self._state = 'steps'
+                        continue
+                    value, end = decoder.raw_decode(buffer, pos)
+                    self._finish(self._key, value)
+                    self._pos = end
+                    self._state = 'key'
+                elif self._state == 'steps':
+                    if buffer[pos] == ']':
+                        self._finish('steps', self._steps)
+                        self._pos = pos + 1
+                        self._state = 'key'
+                        continue
+                    step, end = decoder.raw_decode(buffer, pos)
+                    self.plan.steps.append(Step.from_dict(step))
+                    self._steps.append(step)
+                    self._pos = end
+                else:
+                    return
+            except (ValueError, KeyError, AttributeError, TypeError):
+                # Not complete yet
+                return
+
+    @staticmethod
+    def _skip(buffer, pos):
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        return pos
+
+    def _finish(self, key, value):
+        if key in SECTIONS:
+            if key != 'steps':
+                self.plan.set_section(key, value)
+            self._done.add(key)
+
+    def _render(self, final=False):
+        parts = []
+        while self._section < len(SECTIONS):
+            name = SECTIONS[self._section]
+            if name == 'steps':
+                steps = self.plan.steps
+                if steps and not self._rendered_steps:
+                    parts.append(STEPS_HEADING)
+                for number in range(self._rendered_steps + 1, len(steps) + 1):
+                    parts.append(steps[number - 1].markdown(number))
+                self._rendered_steps = len(steps)
+            elif name in self._done or final:
+                parts.append(self.plan.section_markdown(name))
+            if name not in self._done and not final:
+                break
+            self._section += 1
+        return ''.join(parts)
@@ -0,0 +1,203 @@
+"""
+Asyncio research engine that fans a query out to several providers at once
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+_loop = None
+_blocking = None
+_loop_lock = threading.Lock()
+
+
+def background_loop():
+    """The process-wide event loop that search_sync runs searches on
+
+    It runs forever on a daemon thread, so a search returns at its deadline
+    instead of waiting for stragglers the way asyncio.run() would.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='research-loop', daemon=True).start()
+        return _loop
+
+
+def blocking_executor():
+    """Long-lived threads for providers that block, shared by every search"""
+    global _blocking
+    with _loop_lock:
+        if _blocking is None:
+            _blocking = ThreadPoolExecutor(max_workers=8, thread_name_prefix='research')
+        return _blocking
+
+
+class ResearchProvider:
+    """A source of resource recommendations
+
+    Subclasses implement `async search(query, limit)` and return a list of
+    {'title': ..., 'link': ...} dicts, raising on failure.
+    """
+
+    name = 'provider'
+
+    async def search(self, query, limit):
+        raise NotImplementedError
+
+
+class WebSearchProvider(ResearchProvider):
+    """The WebResearch scraper, run on a blocking_executor() thread"""
+
+    name = 'web'
+
+    def __init__(self, researcher):
+        self.researcher = researcher
+
+    async def search(self, query, limit):
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(blocking_executor(), self.researcher.search_web, query)
+        if isinstance(results, str):
+            raise RuntimeError(results)
+        return results[:limit]
+
+
+class LocalFileProvider(ResearchProvider):
+    """Offline resources from a JSON file, ranked by word overlap with the query
+
+    The file holds a list of objects with "title" and "link" and optionally
+    "description" and "tags".
+    """
+
+    name = 'local'
+
+    def __init__(self, entries):
+        self.entries = []
+        for entry in entries:
+            text = ' '.join([entry.get('title', ''), entry.get('description', '')]
+                            + list(entry.get('tags', [])))
+            self.entries.append((set(re.findall(r'[a-z0-9+#]+', text.lower())), entry))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    async def search(self, query, limit):
+        words = set(re.findall(r'[a-z0-9+#]+', query.lower()))
+        scored = [(len(words & terms), entry) for terms, entry in self.entries]
+        scored = [item for item in scored if item[0]]
+        scored.sort(key=lambda item: -item[0])
+        return [{'title': e['title'], 'link': e['link']} for _, e in scored[:limit]]
+
+
+class MockProvider(ResearchProvider):
+    """Canned results after an optional delay, or a canned error; for tests and benchmarks"""
+
+    def __init__(self, results=(), delay=0.0, error=None, name='mock'):
+        self.results = list(results)
+        self.delay = delay
+        self.error = error
+        self.name = name
+        self.calls = 0
+
+    async def search(self, query, limit):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.results[:limit]
+
+
+class ResearchEngine:
+    """Query every healthy provider at once and keep the first `limit` unique results
+
+    A provider that fails or misses the deadline `max_failures` times in a
+    row sits out for `cooldown` seconds, so a dead source stops costing
+    anything.
+    """
+
+    def __init__(self, providers, limit=3, deadline=3.0, max_failures=3, cooldown=30.0):
+        self.providers = list(providers)
+        self.limit = limit
+        self.deadline = deadline
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self._failures = {}
+        self._benched_until = {}
+
+    def healthy_providers(self):
+        now = time.monotonic()
+        return [p for p in self.providers if self._benched_until.get(p, 0) <= now]
+
+    async def search(self, query, limit=None, deadline=None):
+        """Return as soon as `limit` results are in or the deadline passes"""
+        limit = limit or self.limit
+        deadline = self.deadline if deadline is None else deadline
+
+        providers = self.healthy_providers()
+        tasks = [asyncio.create_task(self._ask(p, query, limit)) for p in providers]
+        results = []
+        seen = set()
+        timed_out = False
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=deadline):
+                try:
+                    batch = await next_done
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    break
+                for result in batch:
+                    link = result.get('link')
+                    if result.get('title') and link and link not in seen:
+                        seen.add(link)
+                        results.append(result)
+                if len(results) >= limit:
+                    break
+        finally:
+            for provider, task in zip(providers, tasks):
+                if not task.done():
+                    task.cancel()
+                    if timed_out:
+                        metrics.incr('errors', stage=f"research_{provider.name}_deadline")
+                        self._failed(provider)
+        return results[:limit]
+
+    def search_sync(self, query, limit=None, deadline=None):
+        """Blocking wrapper around search() for code outside an event loop
+
+        The search runs on background_loop(), so this returns at the deadline
+        even while a provider's thread is still stuck on a slow page.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.search(query, limit, deadline), background_loop())
+        return future.result()
+
+    async def _ask(self, provider, query, limit):
+        """Query one provider, keeping track of its health; failures give no results"""
+        started = time.perf_counter()
+        try:
+            results = await provider.search(query, limit)
+        except asyncio.CancelledError:
+            metrics.incr('research_cancelled', provider=provider.name)
+            raise
+        except Exception:
+            metrics.incr('errors', stage=f"research_{provider.name}")
+            self._failed(provider)
+            return []
+        self._failures[provider] = 0
+        metrics.observe(f"research_{provider.name}", time.perf_counter() - started)
+        return results
+
+    def _failed(self, provider):
+        """Count a failure or missed deadline, benching the provider after too many"""
+        failures = self._failures.get(provider, 0) + 1
+        self._failures[provider] = failures
+        if failures >= self.max_failures:
+            self._benched_until[provider] = time.monotonic() + self.cooldown
+            self._failures[provider] = 0
@@ -0,0 +1,133 @@
+"""
+Process-wide resources shared by every PlannerAgent
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import ResponseCache
+from intent import open_intent_classifier
+from jobs import PlanJobs
+from knowledge_index import KnowledgeIndex, KnowledgeIndexProvider, index_path
+from main import create_scheduler, open_goal_index, open_plan_cache
+from memory_store import open_memory_store
+from metrics import metrics, serve_prometheus, start_json_log
+from research_engine import LocalFileProvider
+from summarizer import PlanSummarizer
+from user_state import UserStateManager
+
+
+def create_http_session(pool_size=16):
+    """HTTP session with a connection pool sized for concurrent research"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    })
+    return session
+
+
+def open_research_cache():
+    """Open the on-disk web research cache configured by RESEARCH_CACHE_PATH"""
+    return ResponseCache(
+        os.getenv('RESEARCH_CACHE_PATH', os.path.join('.cache', 'research.sqlite3')),
+        table='research',
+        max_entries=1024,
+        # Expired results stay around for a day so they can be revalidated
+        stale_ttl=24 * 3600
+    )
+
+
+def offline_research_providers():
+    """Research providers that work without network access
+
+    Uses the knowledge index at KNOWLEDGE_INDEX_PATH and the resource list
+    in RESEARCH_LOCAL_FILE, whichever exist.
+    """
+    providers = []
+    if os.path.exists(index_path()):
+        providers.append(KnowledgeIndexProvider(KnowledgeIndex(index_path())))
+    path = os.getenv('RESEARCH_LOCAL_FILE')
+    if path and os.path.exists(path):
+        providers.append(LocalFileProvider.from_file(path))
+    return providers
+
+
+def start_metrics_exporters():
+    """Serve Prometheus metrics on METRICS_PORT and log JSON snapshots to METRICS_LOG, if set"""
+    port = os.getenv('METRICS_PORT')
+    if port:
+        try:
+            serve_prometheus(int(port))
+            print(f"📈 Metrics at http://127.0.0.1:{port}/metrics")
+        except OSError as e:
+            print(f"⚠️ Could not serve metrics on port {port}: {e}")
+    path = os.getenv('METRICS_LOG')
+    if path:
+        start_json_log(path, float(os.getenv('METRICS_LOG_INTERVAL', 60)))
+
+
+class SharedResources:
+    """Connection pools, caches and workers that don't belong to any one user
+
+    Per-user state (conversation history, student profile) stays on each
+    PlannerAgent; everything here is safe to use from many threads.
+    """
+
+    def __init__(self, http_pool_size=16, research_workers=8):
+        # One HTTP connection pool for all research requests
+        self.http_session = create_http_session(http_pool_size)
+        self.research_cache = open_research_cache()
+        self.research_providers = offline_research_providers()
+
+        self.plan_cache = open_plan_cache()
+        self.goal_index = open_goal_index()
+        # Learning style, research need and category of each goal
+        self.intent_classifier = open_intent_classifier()
+
+        # Conversation memory for every user, keyed by user id
+        self.memory_store = open_memory_store()
+        # Condenses stored plans for later prompts without delaying responses
+        self.summarizer = PlanSummarizer()
+
+        # Quota limits apply to the API key, so one scheduler serves every user
+        self.scheduler = create_scheduler()
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=research_workers, thread_name_prefix='research'
+        )
+        # Plans requested from the UI, generated independently of script reruns
+        self.plan_jobs = PlanJobs(workers=int(os.getenv('PLAN_JOB_WORKERS', 8)))
+        # Each active user's PlannerAgent, with idle users evicted past the budget
+        self.user_states = UserStateManager(
+            self, budget_bytes=int(float(os.getenv('USER_STATE_BUDGET_MB', 256)) * 2 ** 20)
+        )
+        
+        metrics.register('plan_cache', self.plan_cache.stats)
+        metrics.register('research_cache', self.research_cache.stats)
+        metrics.register('plan_jobs', self.plan_jobs.stats)
+        metrics.register('user_states', self.user_states.stats)
+        metrics.register('scheduler', lambda: {
+            'retries': self.scheduler.retries,
+            'errors': self.scheduler.errors,
+            'deduplicated': self.scheduler.deduplicated
+        })
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_resources():
+    """Return the process-wide SharedResources, creating them on first use"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SharedResources()
+            start_metrics_exporters()
+        return _shared
@@ -0,0 +1,163 @@
+"""
+Bounded-concurrency scheduler for Gemini calls: rate limits, retries, deduplication
+"""
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+# HTTP statuses worth retrying: quota exhaustion and transient server errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable',
+                    'InternalServerError', 'DeadlineExceeded', 'BadGateway', 'GatewayTimeout'}
+
+
+def estimate_tokens(text):
+    """Rough token count for quota accounting (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def is_retryable(error):
+    """Whether a failed call is worth trying again"""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+class TokenBucket:
+    """Allow up to `per_minute` units per minute, refilled continuously"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.available = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Block until `amount` units are available, then take them"""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                wait = (amount - self.available) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        """Charge (positive) or refund (negative) units after the fact"""
+        with self._lock:
+            self._refill()
+            self.available = min(self.capacity, self.available - amount)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+class RequestScheduler:
+    """Run model calls with a cap on in-flight requests, RPM/TPM limits and retries
+
+    Calls that share a dedup key while one of them is in flight wait for
+    that call's result instead of sending their own request.
+    """
+
+    def __init__(self, max_in_flight=4, requests_per_minute=60, tokens_per_minute=1000000,
+                 max_retries=4, base_delay=1.0, max_delay=30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+
+        self.retries = 0
+        self.errors = 0
+        self.deduplicated = 0
+
+    def call(self, fn, key=None, tokens=0):
+        """Run fn() under the limits and return (result, owned)
+
+        owned is False when the result came from another caller's identical
+        call: this caller took no tokens, so it must not settle them either.
+        """
+        if key is None:
+            return self._run(fn, tokens), True
+
+        with self._in_flight_lock:
+            shared = self._in_flight.get(key)
+            if shared is None:
+                shared = self._in_flight[key] = Future()
+                owner = True
+            else:
+                self.deduplicated += 1
+                owner = False
+        if not owner:
+            return shared.result(), False
+
+        try:
+            result = self._run(fn, tokens)
+            shared.set_result(result)
+            return result, True
+        except Exception as e:
+            shared.set_exception(e)
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+
+    def stream(self, start, tokens=0):
+        """Run a streaming call under the limits, yielding its chunks
+
+        start() must return an iterable of chunks. Retries only happen
+        until the first chunk arrives, so callers never see repeated text.
+        """
+        with self._slots:
+            attempt = 0
+            while True:
+                self._admit(tokens)
+                try:
+                    iterator = iter(start())
+                    first = next(iterator, None)
+                    break
+                except Exception as e:
+                    attempt = self._after_failure(e, attempt)
+            if first is not None:
+                yield first
+            yield from iterator
+
+    def delay(self, attempt):
+        """Exponential backoff with full jitter for the given retry attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _run(self, fn, tokens):
+        with self._slots:
+            attempt = 0
+            while True:
+                self._admit(tokens)
+                try:
+                    return fn()
+                except Exception as e:
+                    attempt = self._after_failure(e, attempt)
+
+    def _admit(self, tokens):
+        self.requests.acquire()
+        if tokens:
+            self.tokens.acquire(tokens)
+
+    def _after_failure(self, error, attempt):
+        """Sleep before the next attempt, or re-raise if we should give up"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            self.errors += 1
+            raise error
+        self.retries += 1
+        time.sleep(self.delay(attempt))
+        return attempt + 1
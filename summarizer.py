@@ -0,0 +1,61 @@
+"""
+Background compression of stored plans into compact summaries
+"""
+import queue
+import threading
+
+from metrics import metrics
+from plan_model import load_plan
+
+
+def summarize_plan(goal, plan):
+    """Structured summary of a plan: the goal, its step titles and their timelines
+
+    `plan` may be a Plan, its stored JSON or a free-form markdown plan.
+    """
+    return load_plan(goal, plan).summary_dict()
+
+
+def render_summary(summary):
+    """One compact line per step, for pasting into a prompt"""
+    if not summary['steps']:
+        return f"(plan for: {summary['goal']})"
+    return '; '.join(
+        f"{i}. {step['title']}"
+        + (f" ({step['time']})" if step['time'] and step['time'] not in step['title'] else '')
+        for i, step in enumerate(summary['steps'], 1)
+    )
+
+
+class PlanSummarizer:
+    """Worker thread that summarizes plans after they have been returned
+
+    submit() only enqueues, so the response path never waits on it.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='plan-summarizer', daemon=True)
+        self._worker.start()
+
+    def submit(self, store, user_id, entry, on_done=None):
+        """Summarize a memory entry and save the summary next to it in the store"""
+        self._queue.put((store, user_id, entry, on_done))
+
+    def join(self):
+        """Wait until everything submitted so far has been summarized"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            store, user_id, entry, on_done = self._queue.get()
+            try:
+                with metrics.span('summarize'):
+                    summary = summarize_plan(entry['user'], entry['assistant'])
+                store.set_summary(user_id, entry['id'], summary)
+                if on_done is not None:
+                    on_done(entry['id'], summary)
+            except Exception as e:
+                print(f"⚠️ Could not summarize plan {entry.get('id')}: {e}")
+            finally:
+                self._queue.task_done()
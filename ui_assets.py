@@ -0,0 +1,191 @@
+"""
+Static styling and markup for the Streamlit UI
+
+Kept out of app.py so Streamlit builds them once per process instead of
+on every rerun of the script.
+"""
+
+# Custom CSS for creative styling
+CSS = """
+    <style>
+    /* Global Styles */
+    :root {
+        --primary-color: #6366F1;
+        --secondary-color: #EC4899;
+        --accent-color: #F59E0B;
+        --success-color: #10B981;
+        --danger-color: #EF4444;
+    }
+    
+    /* Main Header with Gradient */
+    .main-header {
+        # background: linear-gradient(135deg, #6366F1 0%, #EC4899 50%, #F59E0B 100%);
+        # padding: 1px;
+        # border-radius: 20px;
+        text-align: center;
+        color: white;
+        margin-bottom: 20px;
+        # box-shadow: 0 5px 15px rgba(99, 102, 241, 0.3);
+    }
+    
+    .main-header h1 {
+        font-size: 1.8em;
+        margin: 0;
+        text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
+    }
+    
+    .main-header h3 {
+        margin: -20px 0 0 0;
+        opacity: 0.95;
+        font-size: 1em;
+    }
+    
+    .main-header p {
+        margin: -10px 0 0 0;
+        font-size: 0.9em;
+        opacity: 0.9;
+    }
+    
+    /* Goal Section */
+    .goal-section {
+        background: linear-gradient(135deg, #E0E7FF 0%, #FCE7F3 100%);
+        padding: 10px;
+        border-radius: 15px;
+        margin-bottom: 10px;
+        border: 2px solid #6366F1;
+        border-left: 6px solid #EC4899;
+        box-shadow: 0 4px 15px rgba(99, 102, 241, 0.15);
+        transition: all 0.3s ease;
+    }
+    
+    .goal-section:hover {
+        box-shadow: 0 8px 25px rgba(99, 102, 241, 0.25);
+        transform: translateY(-2px);
+    }
+    
+    .goal-section h3 {
+        color: #4F46E5;
+        margin-top: 0;
+        font-size: 1.3em;
+    }
+    
+    .goal-section p {
+        color: #6B7280;
+        line-height: 1.6;
+    }
+    
+    /* Plan Section */
+    .plan-section {
+        background: linear-gradient(135deg, #F0F9FF 0%, #F5F3FF 50%, #FEF3C7 100%);
+        padding: 25px;
+        border-radius: 15px;
+        margin: 20px 0;
+        border: 2px dashed #6366F1;
+        box-shadow: 0 4px 15px rgba(99, 102, 241, 0.1);
+    }
+    
+    .plan-section h3 {
+        color: #10B981;
+        margin-top: 0;
+        font-size: 1.3em;
+    }
+    
+    /* Success Box */
+    .success-box {
+        background: linear-gradient(135deg, #D1FAE5 0%, #A7F3D0 100%);
+        padding: 20px;
+        border-radius: 12px;
+        border-left: 5px solid #10B981;
+        color: #065F46;
+        margin: 15px 0;
+        box-shadow: 0 4px 12px rgba(16, 185, 129, 0.15);
+    }
+    
+    .success-box h3 {
+        color: #047857;
+        margin-top: 0;
+    }
+    
+    .success-box p {
+        color: #065F46;
+    }
+    
+    /* Info Box */
+    .info-box {
+        background: linear-gradient(135deg, #FEF3C7 0%, #FCD34D 100%);
+        padding: 20px;
+        border-radius: 15px;
+        border-left: 5px solid #F59E0B;
+        color: #92400E;
+        margin: 15px 0;
+        box-shadow: 0 4px 12px rgba(245, 158, 11, 0.15);
+    }
+    
+    .info-box h4 {
+        color: #D97706;
+        margin-top: 0;
+    }
+    
+    /* Feature Cards */
+    .feature-card {
+        background: linear-gradient(135deg, #F3E8FF 0%, #FEE2E2 100%);
+        padding: 20px;
+        border-radius: 12px;
+        border: 2px solid #EC4899;
+        margin: 10px 0;
+        transition: all 0.3s ease;
+    }
+    
+    .feature-card h4 {
+        color: #9F1239;
+        margin-top: 0;
+    }
+    
+    .feature-card p {
+        color: #6B7280;
+    }
+    
+    .feature-card:hover {
+        transform: translateX(5px);
+        box-shadow: 0 4px 15px rgba(236, 72, 153, 0.2);
+    }
+    
+    /* Buttons */
+    .stButton > button {
+        background: linear-gradient(135deg, #6366F1 0%, #EC4899 100%);
+        color: white !important;
+        border: none;
+        border-radius: 10px;
+        padding: 12px 24px;
+        font-weight: 600;
+        transition: all 0.3s ease;
+        box-shadow: 0 4px 15px rgba(99, 102, 241, 0.3);
+    }
+    
+    .stButton > button:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 6px 20px rgba(99, 102, 241, 0.4);
+    }
+    
+    /* Text Area */
+    .stTextArea textarea {
+        border: 2px solid #6366F1 !important;
+        border-radius: 10px !important;
+    }
+    
+    /* Progress Bar */
+    .stProgress > div > div > div {
+        background: linear-gradient(90deg, #6366F1 0%, #EC4899 100%);
+    }
+    
+    </style>
+"""
+
+# Creative Header
+HEADER = """
+    <div class='main-header'>
+        <h1>🎓 Professor Planwell</h1>
+        <h3>✨ Your AI-Powered Planning Assistant ✨</h3>
+        <p>Transform your wildest dreams into actionable step-by-step plans</p>
+    </div>
+"""
@@ -0,0 +1,70 @@
+"""
+Per-user planner state for the Streamlit app, kept within a memory budget
+"""
+import threading
+from collections import OrderedDict
+
+from metrics import metrics
+
+# What a PlannerAgent takes apart from its conversation context: the
+# teacher, planner and research objects (measured at about 3.3 KB)
+AGENT_BYTES = 4096
+
+
+class UserStateManager:
+    """PlannerAgents for recently active users; the least recently used go first
+
+    Evicting a user drops their agent and moves their history out of
+    process memory (MemoryStore.evict). Everything an agent needs, its
+    history and student profile, lives in the memory store, so the next
+    request from that user restores it and rebuilds the agent without them
+    noticing. A store that cannot evict (MemoryStore.evicts is False) keeps
+    its memory outside the budget, since evicting a user would not free it.
+    """
+
+    def __init__(self, resources, budget_bytes):
+        self.resources = resources
+        self.budget_bytes = budget_bytes
+        self._agents = OrderedDict()
+        self._sizes = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def agent(self, user_id):
+        """The user's PlannerAgent, created or rebuilt if needed, marked as just used"""
+        with self._lock:
+            agent = self._agents.get(user_id)
+            if agent is None:
+                self.resources.memory_store.restore(user_id)
+                agent = self._agents[user_id] = self._create(user_id)
+                metrics.incr('user_states', result='miss')
+            else:
+                self._agents.move_to_end(user_id)
+                metrics.incr('user_states', result='hit')
+
+            # Only this user's footprint is re-measured: idle users don't grow
+            store = self.resources.memory_store
+            size = AGENT_BYTES + agent.teacher.context_builder.resident_bytes()
+            if store.evicts:
+                size += store.resident_bytes(user_id)
+            self._total += size - self._sizes.get(user_id, 0)
+            self._sizes[user_id] = size
+            self._evict_over_budget()
+            return agent
+
+    def _create(self, user_id):
+        # Imported here because web_research imports resources, which owns this manager
+        from web_research import PlannerAgent
+        return PlannerAgent(resources=self.resources, user_id=user_id)
+
+    def _evict_over_budget(self):
+        # The most recent user is never evicted, however large
+        while self._total > self.budget_bytes and len(self._agents) > 1:
+            user_id, _ = self._agents.popitem(last=False)
+            self._total -= self._sizes.pop(user_id)
+            self.resources.memory_store.evict(user_id)
+            metrics.incr('user_states', result='evicted')
+
+    def stats(self):
+        with self._lock:
+            return {'users': len(self._agents), 'bytes': self._total, 'budget_bytes': self.budget_bytes}
@@ -1,50 +1,154 @@
-import requests
-from bs4 import BeautifulSoup
-from main import GeminiTeacher, PlanningSystem
+import codecs
+import time
+from urllib.parse import quote
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from context_builder import EMPTY_CONTEXT
+from extraction import StreamingResultExtractor
+from research_engine import ResearchEngine, WebSearchProvider
+from main import EnhancedTeacher, PlanningSystem, normalize_goal, report_progress
+from metrics import metrics
+from plan_model import load_plan
+from resources import create_http_session, get_shared_resources
 
 
 class WebResearch:
     """Web search functionality for research and resource discovery"""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+    # Where queries are sent; {query} is replaced with the URL-quoted query
+    search_url = "https://www.google.com/search?q={query}"
+    
+    def __init__(self, session=None, cache=None, ttl=24 * 3600, negative_ttl=60,
+                 extractor=None, timeout=(3.05, 5), max_seconds=8.0, max_bytes=512 * 1024):
+        # Pass a shared session to reuse its connection pool
+        self.session = session or create_http_session()
+        
+        # Optional ResponseCache of results by normalized query. Failed and
+        # empty searches are remembered only briefly (negative_ttl)
+        self.cache = cache
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        
+        # Hard limits on each search: (connect, read) socket timeouts, total
+        # time spent reading the body, and how much of the body we read
+        self.extractor = extractor or StreamingResultExtractor()
+        self.timeout = timeout
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.max_results = 3
     
     def search_web(self, query):
         """Simple web search (you can enhance this with proper search API)"""
+        key = normalize_goal(query)
+        entry = self.cache.lookup(key) if self.cache is not None else None
+        if entry is not None and entry.fresh:
+            metrics.incr('research_lookups', result='hit')
+            return entry.value
+        
+        # A stale entry can be revalidated instead of downloaded and parsed again
+        headers = {}
+        if entry is not None and not isinstance(entry.value, str):
+            if entry.meta.get('etag'):
+                headers['If-None-Match'] = entry.meta['etag']
+            if entry.meta.get('last_modified'):
+                headers['If-Modified-Since'] = entry.meta['last_modified']
+        
         try:
             # This is a basic example - consider using Google Search API for production
-            url = f"https://www.google.com/search?q={requests.utils.quote(query)}"
-            response = self.session.get(url)
-            soup = BeautifulSoup(response.text, 'html.parser')
+            url = self.search_url.format(query=quote(query))
+            with metrics.span('search_request'):
+                response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+            with response:
+                if response.status_code == 304 and headers:
+                    metrics.incr('research_lookups', result='revalidated')
+                    self.remember(key, entry.value, entry.meta)
+                    return entry.value
+                metrics.incr('research_lookups', result='miss')
+                
+                # Reading the body and parsing it are interleaved; split the time
+                download = [0.0]
+                started = time.perf_counter()
+                results = self.extractor.extract(self.read_text(response, download), self.max_results)
+                metrics.observe('search_download', download[0])
+                metrics.observe('search_parse', time.perf_counter() - started - download[0])
             
-            # Extract basic information (simplified)
-            results = []
-            for g in soup.find_all('div', class_='g')[:3]:  # First 3 results
-                anchor = g.find('a')
-                if anchor:
-                    link = anchor.get('href')
-                    title = g.find('h3')
-                    if title:
-                        results.append({
-                            'title': title.text,
-                            'link': link
-                        })
-            return results[:3]  # Return top 3 results
+            self.remember(key, results, {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
+            })
+            return results
             
         except Exception as e:
-            return f"Web search unavailable: {str(e)}"
+            metrics.incr('errors', stage='search_web')
+            message = f"Web search unavailable: {str(e)}"
+            self.remember(key, message)
+            return message
+    
+    def read_text(self, response, timing=None):
+        """Yield the decoded body in chunks, stopping at max_bytes or max_seconds
+        
+        If given, timing[0] is increased by the time spent waiting on the network.
+        """
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+        deadline = time.monotonic() + self.max_seconds
+        remaining = self.max_bytes
+        chunks = response.iter_content(chunk_size=16 * 1024)
+        while True:
+            started = time.perf_counter()
+            chunk = next(chunks, None)
+            if timing is not None:
+                timing[0] += time.perf_counter() - started
+            if chunk is None:
+                break
+            chunk = chunk[:remaining]
+            remaining -= len(chunk)
+            yield decoder.decode(chunk)
+            if remaining <= 0 or time.monotonic() >= deadline:
+                break
+        yield decoder.decode(b'', final=True)
+    
+    def remember(self, key, results, meta=None):
+        """Cache search results; failures and empty pages only for negative_ttl"""
+        if self.cache is None:
+            return
+        ttl = self.ttl if results and not isinstance(results, str) else self.negative_ttl
+        self.cache.set(key, results, ttl=ttl, meta=meta)
 
 
 class PlannerAgent:
     """Main agent coordinating planning, teaching, and web research"""
     
-    def __init__(self):
-        self.teacher = GeminiTeacher()
-        self.planner = PlanningSystem(self.teacher)
-        self.researcher = WebResearch()
+    def __init__(self, research_timeout=4.0, resources=None, user_id='default'):
+        # Model clients, caches and connection pools are shared process-wide;
+        # only the teacher's memory and profile belong to this agent's user
+        self.resources = resources or get_shared_resources()
+        
+        self.classifier = self.resources.intent_classifier
+        self.teacher = EnhancedTeacher(
+            memory=self.resources.memory_store,
+            user_id=user_id,
+            summarizer=self.resources.summarizer,
+            classifier=self.classifier
+        )
+        self.planner = PlanningSystem(
+            self.teacher,
+            cache=self.resources.plan_cache,
+            goal_index=self.resources.goal_index,
+            scheduler=self.resources.scheduler
+        )
+        self.researcher = WebResearch(
+            session=self.resources.http_session, cache=self.resources.research_cache
+        )
+        
+        # Research runs next to plan generation on the shared workers, asking
+        # the web scraper and any offline sources at the same time
+        self.research_timeout = research_timeout
+        self.executor = self.resources.executor
+        self.research_engine = ResearchEngine(
+            [WebSearchProvider(self.researcher)] + self.resources.research_providers,
+            deadline=research_timeout
+        )
         
         # Teacher's introduction
         self.introduction = """
@@ -59,44 +163,181 @@ class PlannerAgent:
         What goal would you like to work on today? 🎯
         """
     
-    def process_goal(self, user_goal):
-        """Main method to process user goals"""
+    def needs_research(self, user_goal):
+        """Check if web research would help with this goal"""
+        return self.classifier.classify(user_goal).needs_research
+    
+    def read_goal(self, user_goal, remember=True):
+        """Classify the goal once: whether to research it, and the student's learning style
+        
+        The style is noted in the profile before the plan is requested, so
+        this goal is already planned for it.
+        """
+        intent = self.classifier.classify(user_goal)
+        if remember:
+            self.teacher.update_learning_style(intent.learning_style)
+        return intent
+    
+    def start_research(self, user_goal, intent=None):
+        """Kick off web research in the background, or return None if not needed"""
+        needed = intent.needs_research if intent is not None else self.needs_research(user_goal)
+        if not needed:
+            return None
+        print("🔍 Professor is checking for additional resources...")
+        return self.executor.submit(self.research_engine.search_sync, user_goal)
+    
+    def collect_research(self, future, started_at):
+        """Wait for background research, but never past the research timeout"""
+        if future is None:
+            return None
+        remaining = max(0.0, self.research_timeout - (time.monotonic() - started_at))
+        try:
+            return future.result(timeout=remaining)
+        except FutureTimeout:
+            # Don't hold a finished plan hostage to a slow search
+            future.cancel()
+            return None
+    
+    def merge_research(self, plan, web_results):
+        """Attach research results to the plan as Resources"""
+        if web_results and not isinstance(web_results, str) and not plan.error:
+            plan.add_resources(web_results)
+        return plan
+    
+    def process_goal(self, user_goal, on_progress=None, use_cache=True, remember=True):
+        """Main method to process user goals; returns a Plan
+        
+        on_progress, if given, is called with each stage name from
+        main.PROGRESS_STAGES as the goal moves through the pipeline.
+        Pass use_cache=False to always generate a fresh plan, and
+        remember=False to plan without using or updating the memory.
+        """
         
+        with metrics.span('process_goal'):
+            return self._process_goal(user_goal, on_progress, use_cache, remember)
+    
+    def _process_goal(self, user_goal, on_progress, use_cache, remember):
         print(f"\n📚 Student's Goal: {user_goal}")
         print("🤔 Professor is thinking...")
         
         # Check if this relates to previous conversations
         context = self.teacher.get_context()
-        if "No previous conversation" not in context:
+        if context != EMPTY_CONTEXT:
             print("📖 Professor is reviewing your progress...")
         
+        # Start the research fetch first so it overlaps with plan generation
+        started_at = time.monotonic()
+        intent = self.read_goal(user_goal, remember)
+        research = self.start_research(user_goal, intent)
+        
         # Create the main plan
-        plan = self.planner.create_structured_plan(user_goal)
+        plan = self.planner.create_structured_plan(
+            user_goal, on_progress=on_progress, use_cache=use_cache, remember=remember
+        )
+        
+        with metrics.span('research_wait'):
+            web_results = self.collect_research(research, started_at)
+        report_progress(on_progress, 'research_done')
+        
+        plan = self.merge_research(plan, web_results)
+        if remember:
+            plan = self.teacher.personalize_response(plan, self.teacher.learning_style)
+        report_progress(on_progress, 'merged')
+        return plan
+    
+    def stream_goal(self, user_goal, on_progress=None, use_cache=True):
+        """Like process_goal, but yield the plan as markdown chunks as it is generated
+
+        The generator's return value is the finished Plan.
+        """
+        
+        print(f"\n📚 Student's Goal: {user_goal}")
+        print("🤔 Professor is thinking...")
         
-        # Check if web research would help
-        if any(keyword in user_goal.lower() for keyword in ['learn', 'research', 'study', 'find']):
-            print("🔍 Professor is checking for additional resources...")
-            web_results = self.researcher.search_web(user_goal)
-            if web_results and not isinstance(web_results, str):
-                plan += "\n\n🌐 **Additional Resources I Found:**\n"
-                for result in web_results:
-                    plan += f"• {result['title']}\n"
+        started_at = time.monotonic()
+        intent = self.read_goal(user_goal)
+        research = self.start_research(user_goal, intent)
         
+        plan = yield from self.planner.stream_structured_plan(
+            user_goal, on_progress=on_progress, use_cache=use_cache
+        )
+        
+        with metrics.span('research_wait'):
+            web_results = self.collect_research(research, started_at)
+        report_progress(on_progress, 'research_done')
+        
+        # The notes have already streamed, so a new learning style tip goes at the end
+        tips = plan.tips
+        plan = self.teacher.personalize_response(plan, self.teacher.learning_style)
+        extra = ''.join(f"\n{tip}\n" for tip in plan.tips[len(tips):])
+        extra += self.merge_research(plan, web_results).resources_markdown()
+        if extra:
+            yield extra
+        report_progress(on_progress, 'merged')
         return plan
     
+    def revise_plan(self, previous_plan, change_request, use_cache=True):
+        """Apply a follow-up change ("same plan, but over 6 months") to an earlier Plan"""
+        
+        print(f"\n✏️ Student's Change: {change_request}")
+        print("🤔 Professor is revising the plan...")
+        
+        return self.planner.revise_plan(previous_plan, change_request, use_cache=use_cache)
+    
+    def process_goals(self, goals, max_workers=4, use_cache=True):
+        """Plan many independent goals concurrently
+        
+        Yields (index, goal, plan) tuples as each plan finishes, which is
+        not necessarily input order. Goals are pulled from the iterable
+        lazily, so it can be a generator over a very large file. Batch
+        goals don't read or write the conversation memory.
+        """
+        goals = iter(enumerate(goals))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch') as pool:
+            pending = {}
+            
+            def submit_next():
+                for index, goal in goals:
+                    future = pool.submit(
+                        self.process_goal, goal, use_cache=use_cache, remember=False
+                    )
+                    pending[future] = (index, goal)
+                    return True
+                return False
+            
+            # Keep a couple of goals queued per worker, no more
+            while len(pending) < 2 * max_workers and submit_next():
+                pass
+            
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, goal = pending.pop(future)
+                    submit_next()
+                    yield index, goal, future.result()
+    
     def get_progress_report(self):
         """Generate a progress report based on memory"""
-        if not self.teacher.conversation_history:
+        history = self.teacher.conversation_history
+        if not history:
             return "We haven't started working on any goals yet!"
         
-        total_goals = len(self.teacher.conversation_history)
-        recent_goal = self.teacher.conversation_history[-1]['user']
+        plans = [load_plan(entry['user'], entry['assistant']) for entry in history]
+        total_goals = len(history)
+        total_steps = sum(len(plan.steps) for plan in plans)
+        recent_goal = history[-1]['user']
+        first = plans[-1].steps[0] if plans[-1].steps else None
+        next_step = "Review your latest plan" if first is None else (
+            first.title + (f" ({first.time})" if first.time else "")
+        )
         
         report = f"""
         📊 **Progress Report**
         
         Total goals we've worked on: {total_goals}
+        Steps planned so far: {total_steps}
         Most recent goal: {recent_goal}
+        Where to start: {next_step}
         
         I remember all our conversations and can see how you're growing!
         Keep up the great work! 🌟